@@ -93,11 +93,11 @@ def run_webapp():
     """Run the SmartShop web application."""
     try:
         # Import here to avoid importing before checks
-        from smartshop.web_app import app
+        from smartshop.web_app import serve
         
         print("\nStarting SmartShop web application...")
         port = int(os.environ.get('PORT', 5000))
-        app.run(host='0.0.0.0', port=port, debug=True)
+        serve(port=port)
     except Exception as e:
         print(f"Error starting web application: {e}")
         return False
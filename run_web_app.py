@@ -2,8 +2,8 @@
 Run Script for SmartShop Web Application
 """
 
-from smartshop.web_app import app
+from smartshop.web_app import serve
 
 if __name__ == "__main__":
-    # Run the application with debugging enabled
-    app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
+    # Run the application; set FLASK_DEBUG=1 for the debug server
+    serve(port=5000) 
\ No newline at end of file
@@ -29,7 +29,7 @@ class Agent:
         self.name = name
         self.description = description
         self.db = Database()
-        self.llm = OllamaClient()
+        self.llm = OllamaClient(cache_db=self.db)
         self.tools = {}  # Dictionary of available tools
         self.memory_types = ["experiences", "observations", "plans", "reflections"]
         self.system_prompt = f"""You are {name}, an AI agent designed to {description}.
@@ -91,7 +91,7 @@ Always think step-by-step and consider the context and history of the conversati
             memory_type=memory_type,
             memory_key=memory_key,
             memory_value=memory_value,
-            embedding=json.dumps(embedding)
+            embedding=embedding
         )
     
     def retrieve_memory(self, memory_type: str, memory_key: Optional[str] = None) -> Any:
@@ -169,8 +169,8 @@ class CoordinationAgent(Agent):
         # Get similar customers
         similar_customers = self.customer_agent.find_similar_customers(customer_id)
         
-        # Get recommendations for this customer
-        recommendations = self.recommendation_agent.generate_recommendations(customer_id)
+        # Get recommendations for this customer (only the products are used here)
+        recommendations = self.recommendation_agent.generate_recommendations(customer_id, include_explanations=False)
         
         # Generate a comprehensive customer profile summary
         customer_summary = self.customer_agent.generate_customer_profile_summary(customer_id)
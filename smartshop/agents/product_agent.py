@@ -122,18 +122,8 @@ class ProductAgent(Agent):
         
         if result:
             columns = ["product_id", "category", "subcategory", "price", "brand", "product_rating", "similarity_score"]
-            for row in result:
-                product_dict = {}
-                for i, col in enumerate(columns):
-                    # Safely handle potentially binary data
-                    if isinstance(row[i], bytes):
-                        try:
-                            product_dict[col] = row[i].decode('utf-8')
-                        except UnicodeDecodeError:
-                            product_dict[col] = "[Binary data]"
-                    else:
-                        product_dict[col] = row[i]
-                similar_products.append(product_dict)
+            # Text columns are already decoded by the connection's text_factory
+            similar_products = [dict(zip(columns, row)) for row in result]
         
         if not similar_products:
             return {"message": f"No similar products found for {product_id}"}
@@ -197,18 +187,8 @@ class ProductAgent(Agent):
         
         if result:
             columns = ["product_id", "category", "subcategory", "price", "brand", "product_rating"]
-            for row in result:
-                product_dict = {}
-                for i, col in enumerate(columns):
-                    # Safely handle potentially binary data
-                    if isinstance(row[i], bytes):
-                        try:
-                            product_dict[col] = row[i].decode('utf-8')
-                        except UnicodeDecodeError:
-                            product_dict[col] = "[Binary data]"
-                    else:
-                        product_dict[col] = row[i]
-                complementary_products.append(product_dict)
+            # Text columns are already decoded by the connection's text_factory
+            complementary_products = [dict(zip(columns, row)) for row in result]
         
         if not complementary_products:
             return {"message": f"No complementary products found for {product_id}"}
@@ -296,18 +276,8 @@ class ProductAgent(Agent):
         
         if top_result:
             columns = ["product_id", "subcategory", "price", "brand", "product_rating"]
-            for row in top_result:
-                product_dict = {}
-                for i, col in enumerate(columns):
-                    # Safely handle potentially binary data
-                    if isinstance(row[i], bytes):
-                        try:
-                            product_dict[col] = row[i].decode('utf-8')
-                        except UnicodeDecodeError:
-                            product_dict[col] = "[Binary data]"
-                    else:
-                        product_dict[col] = row[i]
-                top_products.append(product_dict)
+            # Text columns are already decoded by the connection's text_factory
+            top_products = [dict(zip(columns, row)) for row in top_result]
         
         # Use LLM to generate insights
         prompt = f"""
@@ -382,18 +352,8 @@ class ProductAgent(Agent):
         
         if result:
             columns = ["product_id", "category", "subcategory", "price", "brand", "product_rating"]
-            for row in result:
-                product_dict = {}
-                for i, col in enumerate(columns):
-                    # Safely handle potentially binary data
-                    if isinstance(row[i], bytes):
-                        try:
-                            product_dict[col] = row[i].decode('utf-8')
-                        except UnicodeDecodeError:
-                            product_dict[col] = "[Binary data]"
-                    else:
-                        product_dict[col] = row[i]
-                trending_products.append(product_dict)
+            # Text columns are already decoded by the connection's text_factory
+            trending_products = [dict(zip(columns, row)) for row in result]
         
         if not trending_products:
             if category:
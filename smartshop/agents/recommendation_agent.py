@@ -4,7 +4,7 @@ Recommendation Agent for generating personalized product recommendations
 
 import sys
 import json
-import random
+import numpy as np
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
 
@@ -53,53 +53,71 @@ class RecommendationAgent(Agent):
             "Generate recommendations based on similar customers' preferences"
         )
     
-    def _score_product_for_customer(self, customer_data: Dict[str, Any], product_data: Dict[str, Any]) -> float:
-        """Calculate a recommendation score for a product and customer.
+    def _score_products_for_customer(self, customer_data: Dict[str, Any], products: List[Dict[str, Any]]) -> np.ndarray:
+        """Calculate recommendation scores for a batch of products for one customer.
         
         Args:
             customer_data: Customer profile data
-            product_data: Product data
+            products: List of product data
             
         Returns:
-            Recommendation score between 0 and 1
+            Array of recommendation scores between 0 and 1, one per product
         """
+        n = len(products)
+        
         # Get browsing and purchase history
         browsing_history = customer_data.get('browsing_history', [])
         purchase_history = customer_data.get('purchase_history', [])
         
-        # Calculate category match score
-        category_match = 0.0
-        if any(product_data['category'] in item for item in browsing_history):
-            category_match += 0.3
-        if any(product_data['category'] in item for item in purchase_history):
-            category_match += 0.5
-            
+        # Calculate category match score once per distinct category
+        category_scores = {}
+        for category in {product['category'] for product in products}:
+            score = 0.0
+            if any(category in item for item in browsing_history):
+                score += 0.3
+            if any(category in item for item in purchase_history):
+                score += 0.5
+            category_scores[category] = score
+        category_match = np.fromiter((category_scores[p['category']] for p in products), dtype=np.float64, count=n)
+        
         # Calculate price match score based on average order value
-        price_match = 0.0
+        price_match = np.zeros(n)
         avg_order_value = customer_data.get('avg_order_value', 0)
         if avg_order_value > 0:
             # Customers tend to buy products with prices close to their average order value
-            price_diff_ratio = abs(product_data['price'] - avg_order_value) / max(avg_order_value, 1000)
-            price_match = max(0, 1 - min(price_diff_ratio, 1))
-            
+            prices = np.fromiter((p['price'] for p in products), dtype=np.float64, count=n)
+            price_diff_ratio = np.abs(prices - avg_order_value) / max(avg_order_value, 1000)
+            price_match = 1 - np.minimum(price_diff_ratio, 1)
+        
         # Use product rating as quality score
-        quality_score = product_data.get('product_rating', 3.0) / 5.0
+        quality_score = np.fromiter((p.get('product_rating', 3.0) for p in products), dtype=np.float64, count=n) / 5.0
         
         # Calculate final score with weights
-        score = (0.4 * category_match) + (0.3 * price_match) + (0.3 * quality_score)
+        scores = (0.4 * category_match) + (0.3 * price_match) + (0.3 * quality_score)
         
         # Add a small random factor for diversity
-        randomness = random.uniform(-0.05, 0.05)
-        score = max(0, min(1, score + randomness))
+        randomness = np.random.uniform(-0.05, 0.05, n)
+        return np.clip(scores + randomness, 0, 1)
+    
+    def _score_product_for_customer(self, customer_data: Dict[str, Any], product_data: Dict[str, Any]) -> float:
+        """Calculate a recommendation score for a product and customer.
         
-        return score
+        Args:
+            customer_data: Customer profile data
+            product_data: Product data
+            
+        Returns:
+            Recommendation score between 0 and 1
+        """
+        return float(self._score_products_for_customer(customer_data, [product_data])[0])
     
-    def generate_recommendations(self, customer_id: str, limit: int = TOP_N_RECOMMENDATIONS) -> Dict[str, Any]:
+    def generate_recommendations(self, customer_id: str, limit: int = TOP_N_RECOMMENDATIONS, include_explanations: bool = True) -> Dict[str, Any]:
         """Generate personalized recommendations for a customer.
         
         Args:
             customer_id: The customer's unique identifier
             limit: Maximum number of recommendations to return
+            include_explanations: Whether to generate LLM explanations for the recommendations
             
         Returns:
             Dict containing recommended products and explanations
@@ -127,43 +145,42 @@ class RecommendationAgent(Agent):
             # Get column names from cursor description
             columns = [desc[0] for desc in self.db.cursor.description]
             
-            for row in result:
-                product_dict = {}
-                for i, col in enumerate(columns):
-                    # Safely handle potentially binary data
-                    if isinstance(row[i], bytes):
-                        try:
-                            product_dict[col] = row[i].decode('utf-8')
-                        except UnicodeDecodeError:
-                            product_dict[col] = "[Binary data]"
-                    else:
-                        product_dict[col] = row[i]
-                potential_products.append(product_dict)
+            # Text columns are already decoded by the connection's text_factory
+            potential_products = [dict(zip(columns, row)) for row in result]
         
         if not potential_products:
             return {"message": "No products available for recommendations"}
         
-        # Score each product for this customer
-        scored_products = []
-        for product in potential_products:
-            score = self._score_product_for_customer(customer, product)
-            if score >= MIN_RECOMMENDATION_SCORE:
-                scored_products.append((product, score))
+        # Score all products for this customer in one vectorized pass
+        scores = self._score_products_for_customer(customer, potential_products)
+        scored_products = [
+            (product, float(score))
+            for product, score in zip(potential_products, scores)
+            if score >= MIN_RECOMMENDATION_SCORE
+        ]
         
         # Sort by score (descending) and take top recommendations
         scored_products.sort(key=lambda x: x[1], reverse=True)
         top_recommendations = scored_products[:limit]
         
+        # Skip the LLM round-trip entirely when there is nothing to explain
+        if not top_recommendations:
+            return {
+                "customer_id": customer_id,
+                "recommendations": [],
+                "explanations": "No recommendations available."
+            }
+        
         # Format recommendations for storage and response
         recommendations_list = []
+        recommendation_rows = []
         for product, score in top_recommendations:
-            # Store recommendation in database
-            rec_data = {
+            # Queue recommendation for storage
+            recommendation_rows.append({
                 'customer_id': customer_id,
                 'product_id': product['product_id'],
                 'score': score
-            }
-            self.db.insert_recommendation(rec_data)
+            })
             
             # Add to response list
             recommendations_list.append({
@@ -175,23 +192,28 @@ class RecommendationAgent(Agent):
                 'score': score
             })
         
-        # Use LLM to generate explanations for the recommendations
-        prompt = f"""
-        Generate personalized explanations for these product recommendations for customer {customer_id}:
-        
-        Customer Profile:
-        {json.dumps({k: v for k, v in customer.items() if k not in ['created_at', 'updated_at']})}
-        
-        Recommended Products:
-        {json.dumps(recommendations_list)}
-        
-        For each recommended product, provide:
-        1. A personalized explanation of why this product would appeal to this customer
-        2. How it relates to their browsing or purchase history
-        3. Any special features of the product that align with the customer's preferences
-        """
+        # Store recommendations in database in one transaction
+        self.db.insert_recommendations_bulk(recommendation_rows)
         
-        explanations = self.llm.generate(prompt, system_prompt=self.system_prompt)
+        # Use LLM to generate explanations for the recommendations, unless the caller discards them
+        explanations = ""
+        if include_explanations:
+            prompt = f"""
+            Generate personalized explanations for these product recommendations for customer {customer_id}:
+            
+            Customer Profile:
+            {json.dumps({k: v for k, v in customer.items() if k not in ['created_at', 'updated_at']})}
+            
+            Recommended Products:
+            {json.dumps(recommendations_list)}
+            
+            For each recommended product, provide:
+            1. A personalized explanation of why this product would appeal to this customer
+            2. How it relates to their browsing or purchase history
+            3. Any special features of the product that align with the customer's preferences
+            """
+            
+            explanations = self.llm.generate(prompt, system_prompt=self.system_prompt)
         
         # Track this as an observation
         observation = f"Generated {len(recommendations_list)} recommendations for customer {customer_id}"
@@ -203,13 +225,14 @@ class RecommendationAgent(Agent):
             "explanations": explanations
         }
     
-    def get_recommendations_by_category(self, customer_id: str, category: str, limit: int = TOP_N_RECOMMENDATIONS) -> Dict[str, Any]:
+    def get_recommendations_by_category(self, customer_id: str, category: str, limit: int = TOP_N_RECOMMENDATIONS, include_explanations: bool = True) -> Dict[str, Any]:
         """Generate recommendations in a specific category for a customer.
         
         Args:
             customer_id: The customer's unique identifier
             category: Product category to recommend from
             limit: Maximum number of recommendations to return
+            include_explanations: Whether to generate LLM explanations for the recommendations
             
         Returns:
             Dict containing recommended products and explanations
@@ -237,43 +260,43 @@ class RecommendationAgent(Agent):
             # Get column names from cursor description
             columns = [desc[0] for desc in self.db.cursor.description]
             
-            for row in result:
-                product_dict = {}
-                for i, col in enumerate(columns):
-                    # Safely handle potentially binary data
-                    if isinstance(row[i], bytes):
-                        try:
-                            product_dict[col] = row[i].decode('utf-8')
-                        except UnicodeDecodeError:
-                            product_dict[col] = "[Binary data]"
-                    else:
-                        product_dict[col] = row[i]
-                potential_products.append(product_dict)
+            # Text columns are already decoded by the connection's text_factory
+            potential_products = [dict(zip(columns, row)) for row in result]
         
         if not potential_products:
             return {"message": f"No products available in category {category}"}
         
-        # Score each product for this customer
-        scored_products = []
-        for product in potential_products:
-            score = self._score_product_for_customer(customer, product)
-            if score >= MIN_RECOMMENDATION_SCORE:
-                scored_products.append((product, score))
+        # Score all products for this customer in one vectorized pass
+        scores = self._score_products_for_customer(customer, potential_products)
+        scored_products = [
+            (product, float(score))
+            for product, score in zip(potential_products, scores)
+            if score >= MIN_RECOMMENDATION_SCORE
+        ]
         
         # Sort by score (descending) and take top recommendations
         scored_products.sort(key=lambda x: x[1], reverse=True)
         top_recommendations = scored_products[:limit]
         
+        # Skip the LLM round-trip entirely when there is nothing to explain
+        if not top_recommendations:
+            return {
+                "customer_id": customer_id,
+                "category": category,
+                "recommendations": [],
+                "explanations": "No recommendations available."
+            }
+        
         # Format recommendations for storage and response
         recommendations_list = []
+        recommendation_rows = []
         for product, score in top_recommendations:
-            # Store recommendation in database
-            rec_data = {
+            # Queue recommendation for storage
+            recommendation_rows.append({
                 'customer_id': customer_id,
                 'product_id': product['product_id'],
                 'score': score
-            }
-            self.db.insert_recommendation(rec_data)
+            })
             
             # Add to response list
             recommendations_list.append({
@@ -285,23 +308,28 @@ class RecommendationAgent(Agent):
                 'score': score
             })
         
-        # Use LLM to generate explanations for the recommendations
-        prompt = f"""
-        Generate personalized explanations for these {category} product recommendations for customer {customer_id}:
-        
-        Customer Profile:
-        {json.dumps({k: v for k, v in customer.items() if k not in ['created_at', 'updated_at']})}
-        
-        Recommended Products in {category} category:
-        {json.dumps(recommendations_list)}
-        
-        For each recommended product, provide:
-        1. A personalized explanation of why this product would appeal to this customer
-        2. How it relates to their browsing or purchase history
-        3. Any special features of the product that align with the customer's preferences
-        """
+        # Store recommendations in database in one transaction
+        self.db.insert_recommendations_bulk(recommendation_rows)
         
-        explanations = self.llm.generate(prompt, system_prompt=self.system_prompt)
+        # Use LLM to generate explanations for the recommendations, unless the caller discards them
+        explanations = ""
+        if include_explanations:
+            prompt = f"""
+            Generate personalized explanations for these {category} product recommendations for customer {customer_id}:
+            
+            Customer Profile:
+            {json.dumps({k: v for k, v in customer.items() if k not in ['created_at', 'updated_at']})}
+            
+            Recommended Products in {category} category:
+            {json.dumps(recommendations_list)}
+            
+            For each recommended product, provide:
+            1. A personalized explanation of why this product would appeal to this customer
+            2. How it relates to their browsing or purchase history
+            3. Any special features of the product that align with the customer's preferences
+            """
+            
+            explanations = self.llm.generate(prompt, system_prompt=self.system_prompt)
         
         # Track this as an observation
         observation = f"Generated {len(recommendations_list)} recommendations in {category} category for customer {customer_id}"
@@ -347,18 +375,8 @@ class RecommendationAgent(Agent):
             # Get column names from cursor description
             columns = [desc[0] for desc in self.db.cursor.description]
             
-            for row in result:
-                product_dict = {}
-                for i, col in enumerate(columns):
-                    # Safely handle potentially binary data
-                    if isinstance(row[i], bytes):
-                        try:
-                            product_dict[col] = row[i].decode('utf-8')
-                        except UnicodeDecodeError:
-                            product_dict[col] = "[Binary data]"
-                    else:
-                        product_dict[col] = row[i]
-                potential_products.append(product_dict)
+            # Text columns are already decoded by the connection's text_factory
+            potential_products = [dict(zip(columns, row)) for row in result]
         
         if not potential_products:
             return {"message": "No products available for recommendations"}
@@ -408,6 +426,7 @@ class RecommendationAgent(Agent):
         
         # Format the recommendations
         recommendations_list = []
+        recommendation_rows = []
         explanations_list = []
         
         # Get the full details for each recommended product
@@ -437,13 +456,15 @@ class RecommendationAgent(Agent):
                 'explanation': rec.get('explanation', '')
             })
             
-            # Store recommendation in database
-            rec_data = {
+            # Queue recommendation for storage
+            recommendation_rows.append({
                 'customer_id': customer_id,
                 'product_id': product_details['product_id'],
                 'score': rec.get('suitability_score', 0.5)
-            }
-            self.db.insert_recommendation(rec_data)
+            })
+        
+        # Store recommendations in database in one transaction
+        self.db.insert_recommendations_bulk(recommendation_rows)
         
         # Use LLM to generate a cohesive explanation for all recommendations
         if recommendations_list:
@@ -512,18 +533,8 @@ class RecommendationAgent(Agent):
             # Get column names from cursor description
             columns = [desc[0] for desc in self.db.cursor.description]
             
-            for row in result:
-                product_dict = {}
-                for i, col in enumerate(columns):
-                    # Safely handle potentially binary data
-                    if isinstance(row[i], bytes):
-                        try:
-                            product_dict[col] = row[i].decode('utf-8')
-                        except UnicodeDecodeError:
-                            product_dict[col] = "[Binary data]"
-                    else:
-                        product_dict[col] = row[i]
-                potential_products.append(product_dict)
+            # Text columns are already decoded by the connection's text_factory
+            potential_products = [dict(zip(columns, row)) for row in result]
         
         if not potential_products:
             return {"message": "No products available for recommendations"}
@@ -573,6 +584,7 @@ class RecommendationAgent(Agent):
         
         # Format the recommendations
         recommendations_list = []
+        recommendation_rows = []
         explanations_list = []
         
         # Get the full details for each recommended product
@@ -602,13 +614,15 @@ class RecommendationAgent(Agent):
                 'explanation': rec.get('explanation', '')
             })
             
-            # Store recommendation in database
-            rec_data = {
+            # Queue recommendation for storage
+            recommendation_rows.append({
                 'customer_id': customer_id,
                 'product_id': product_details['product_id'],
                 'score': rec.get('seasonal_score', 0.5)
-            }
-            self.db.insert_recommendation(rec_data)
+            })
+        
+        # Store recommendations in database in one transaction
+        self.db.insert_recommendations_bulk(recommendation_rows)
         
         # Use LLM to generate a cohesive explanation for all recommendations
         if recommendations_list:
@@ -643,12 +657,13 @@ class RecommendationAgent(Agent):
             "explanations": cohesive_explanation
         }
     
-    def get_similar_customer_recommendations(self, customer_id: str, limit: int = TOP_N_RECOMMENDATIONS) -> Dict[str, Any]:
+    def get_similar_customer_recommendations(self, customer_id: str, limit: int = TOP_N_RECOMMENDATIONS, include_explanations: bool = True) -> Dict[str, Any]:
         """Generate recommendations based on similar customers' preferences.
         
         Args:
             customer_id: The customer's unique identifier
             limit: Maximum number of recommendations to return
+            include_explanations: Whether to generate LLM explanations for the recommendations
             
         Returns:
             Dict containing recommended products and explanations
@@ -658,7 +673,7 @@ class RecommendationAgent(Agent):
         
         if not similar_customers:
             # Fall back to regular recommendations if no similar customers
-            return self.generate_recommendations(customer_id, limit)
+            return self.generate_recommendations(customer_id, limit, include_explanations)
         
         # Get recommendations for each similar customer
         similar_customer_ids = [sc['customer_id'] for sc in similar_customers]
@@ -683,18 +698,8 @@ class RecommendationAgent(Agent):
         
         if result:
             columns = ["product_id", "category", "subcategory", "price", "brand", "product_rating", "recommendation_count"]
-            for row in result:
-                product_dict = {}
-                for i, col in enumerate(columns):
-                    # Safely handle potentially binary data
-                    if isinstance(row[i], bytes):
-                        try:
-                            product_dict[col] = row[i].decode('utf-8')
-                        except UnicodeDecodeError:
-                            product_dict[col] = "[Binary data]"
-                    else:
-                        product_dict[col] = row[i]
-                candidate_products.append(product_dict)
+            # Text columns are already decoded by the connection's text_factory
+            candidate_products = [dict(zip(columns, row)) for row in result]
         
         # If not enough products, query for popular products
         if len(candidate_products) < limit:
@@ -714,55 +719,59 @@ class RecommendationAgent(Agent):
                     if any(p['product_id'] == row[0] for p in candidate_products):
                         continue
                         
-                    product_dict = {}
-                    for i, col in enumerate(columns):
-                        # Safely handle potentially binary data
-                        if isinstance(row[i], bytes):
-                            try:
-                                product_dict[col] = row[i].decode('utf-8')
-                            except UnicodeDecodeError:
-                                product_dict[col] = "[Binary data]"
-                        else:
-                            product_dict[col] = row[i]
+                    product_dict = dict(zip(columns, row))
                     product_dict["recommendation_count"] = 0  # Not recommended by similar customers
                     candidate_products.append(product_dict)
         
         if not candidate_products:
             # Fall back to regular recommendations if no candidate products
-            return self.generate_recommendations(customer_id, limit)
+            return self.generate_recommendations(customer_id, limit, include_explanations)
         
         # Get customer data for personalization
         customer = self.db.get_customer(customer_id)
         
         # Score candidate products based on similar customer preferences and customer profile
-        scored_products = []
-        for product in candidate_products:
-            # Base score from customer preferences
-            base_score = self._score_product_for_customer(customer, product)
-            
-            # Boost score based on recommendation count from similar customers
-            recommendation_boost = min(0.3, product.get("recommendation_count", 0) * 0.1)
-            
-            # Combined score
-            combined_score = base_score + recommendation_boost
-            
-            if combined_score >= MIN_RECOMMENDATION_SCORE:
-                scored_products.append((product, combined_score))
+        # Base score from customer preferences
+        base_scores = self._score_products_for_customer(customer, candidate_products)
+        
+        # Boost score based on recommendation count from similar customers
+        recommendation_counts = np.fromiter(
+            (product.get("recommendation_count", 0) for product in candidate_products),
+            dtype=np.float64, count=len(candidate_products)
+        )
+        recommendation_boosts = np.minimum(0.3, recommendation_counts * 0.1)
+        
+        # Combined score
+        combined_scores = base_scores + recommendation_boosts
+        scored_products = [
+            (product, float(score))
+            for product, score in zip(candidate_products, combined_scores)
+            if score >= MIN_RECOMMENDATION_SCORE
+        ]
         
         # Sort by score (descending) and take top recommendations
         scored_products.sort(key=lambda x: x[1], reverse=True)
         top_recommendations = scored_products[:limit]
         
+        # Skip the LLM round-trip entirely when there is nothing to explain
+        if not top_recommendations:
+            return {
+                "customer_id": customer_id,
+                "similar_customers": similar_customers,
+                "recommendations": [],
+                "explanations": "No recommendations available."
+            }
+        
         # Format recommendations for storage and response
         recommendations_list = []
+        recommendation_rows = []
         for product, score in top_recommendations:
-            # Store recommendation in database
-            rec_data = {
+            # Queue recommendation for storage
+            recommendation_rows.append({
                 'customer_id': customer_id,
                 'product_id': product['product_id'],
                 'score': score
-            }
-            self.db.insert_recommendation(rec_data)
+            })
             
             # Add to response list
             recommendations_list.append({
@@ -774,27 +783,32 @@ class RecommendationAgent(Agent):
                 'score': score
             })
         
-        # Use LLM to generate explanations for the recommendations
-        prompt = f"""
-        Generate personalized explanations for these product recommendations for customer {customer_id}, 
-        based on similar customers' preferences:
-        
-        Customer Profile:
-        {json.dumps({k: v for k, v in customer.items() if k not in ['created_at', 'updated_at']})}
+        # Store recommendations in database in one transaction
+        self.db.insert_recommendations_bulk(recommendation_rows)
         
-        Similar Customers:
-        {json.dumps(similar_customers)}
-        
-        Recommended Products:
-        {json.dumps(recommendations_list)}
-        
-        For each recommended product, provide:
-        1. A personalized explanation of why this product would appeal to this customer
-        2. How it relates to what similar customers have enjoyed
-        3. Any special features of the product that align with the customer's preferences
-        """
-        
-        explanations = self.llm.generate(prompt, system_prompt=self.system_prompt)
+        # Use LLM to generate explanations for the recommendations, unless the caller discards them
+        explanations = ""
+        if include_explanations:
+            prompt = f"""
+            Generate personalized explanations for these product recommendations for customer {customer_id}, 
+            based on similar customers' preferences:
+            
+            Customer Profile:
+            {json.dumps({k: v for k, v in customer.items() if k not in ['created_at', 'updated_at']})}
+            
+            Similar Customers:
+            {json.dumps(similar_customers)}
+            
+            Recommended Products:
+            {json.dumps(recommendations_list)}
+            
+            For each recommended product, provide:
+            1. A personalized explanation of why this product would appeal to this customer
+            2. How it relates to what similar customers have enjoyed
+            3. Any special features of the product that align with the customer's preferences
+            """
+            
+            explanations = self.llm.generate(prompt, system_prompt=self.system_prompt)
         
         # Track this as an observation
         observation = f"Generated {len(recommendations_list)} recommendations for customer {customer_id} based on {len(similar_customers)} similar customers"
@@ -13,27 +13,30 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 from smartshop.config import OLLAMA_BASE_URL, OLLAMA_LLM_MODEL
 
-def check_ollama_running():
+# Keep-alive session shared by the status probes
+_session = requests.Session()
+
+def check_ollama_running(timeout=None):
     """Check if Ollama is running locally."""
     try:
-        response = requests.get(OLLAMA_BASE_URL)
+        response = _session.get(OLLAMA_BASE_URL, timeout=timeout)
         return response.status_code == 200
     except requests.exceptions.RequestException:
         return False
 
-def get_available_models():
+def get_available_models(timeout=None):
     """Get list of available models in Ollama."""
     try:
-        response = requests.get(f"{OLLAMA_BASE_URL}/api/tags")
+        response = _session.get(f"{OLLAMA_BASE_URL}/api/tags", timeout=timeout)
         if response.status_code == 200:
             return response.json().get("models", [])
         return []
     except requests.exceptions.RequestException:
         return []
 
-def is_model_available(model_name):
+def is_model_available(model_name, timeout=None):
     """Check if specified model is available."""
-    models = get_available_models()
+    models = get_available_models(timeout=timeout)
     available_models = [model.get("name") for model in models]
     return model_name in available_models
 
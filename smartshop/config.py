@@ -47,6 +47,7 @@ PRODUCT_DATA_PATH = Path("./Dataset/[Usecase 2] Personalized Recommendations for
 EMBEDDING_MODEL = "qwen2.5:0.5b"  # Model to use for embeddings
 EMBEDDING_DIMENSION = 384  # Dimension of embedding vectors
 SIMILARITY_THRESHOLD = 0.75  # Threshold for similarity matching
+EMBEDDING_CACHE_SIZE = 4096  # Number of embeddings kept in the in-memory LRU cache
 
 # Recommendation settings
 TOP_N_RECOMMENDATIONS = 5  # Number of top recommendations to provide
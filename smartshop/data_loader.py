@@ -7,7 +7,13 @@ import os
 import pandas as pd
 import json
 import ast
+import codecs
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable, List
 from tqdm import tqdm
 
 # Add the parent directory to the system path
@@ -15,6 +21,187 @@ sys.path.append(str(Path(__file__).parent.parent))
 from smartshop.utils.database import Database, init_db
 from smartshop.config import CUSTOMER_DATA_PATH, PRODUCT_DATA_PATH
 
+# Number of CSV rows parsed per batch handed to the database writer
+CSV_CHUNK_SIZE = 5000
+# Maximum number of parsed batches buffered between the reader and the writer
+QUEUE_MAX_BATCHES = 4
+# Number of leading bytes inspected when sniffing a CSV file's encoding
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+def _detect_encoding(file_path: Path) -> str:
+    """Sniff the encoding of a CSV file from a bounded sample of its leading bytes.
+    
+    Args:
+        file_path: Path to the CSV file
+        
+    Returns:
+        'utf-8' if the sample decodes as UTF-8 (ASCII included), otherwise 'latin-1'
+    """
+    with open(file_path, 'rb') as f:
+        sample = f.read(ENCODING_SAMPLE_SIZE)
+    
+    # Incremental decoding tolerates a multi-byte character cut off at the end of the sample
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        print("Successfully decoded sample with utf-8 encoding.")
+        return 'utf-8'
+    except UnicodeDecodeError:
+        print("Failed to decode sample with utf-8 encoding.")
+    
+    # Last resort: latin-1 can decode any byte value
+    print("Using latin-1 encoding as fallback...")
+    return 'latin-1'
+
+def _iter_csv_chunks(file_path: Path, encoding: str):
+    """Read a CSV file in chunks, switching to latin-1 if bytes past the sample fail to decode.
+    
+    Args:
+        file_path: Path to the CSV file
+        encoding: Encoding sniffed from the start of the file
+        
+    Yields:
+        DataFrame chunks of at most CSV_CHUNK_SIZE rows
+    """
+    rows_read = 0
+    try:
+        for chunk in pd.read_csv(file_path, encoding=encoding, chunksize=CSV_CHUNK_SIZE):
+            rows_read += len(chunk)
+            yield chunk
+    except UnicodeDecodeError as e:
+        if encoding == 'latin-1':
+            raise
+        print(f"Failed to decode {file_path} with {encoding} encoding after {rows_read} rows: {e}")
+        print("Using latin-1 encoding as fallback for the remaining rows...")
+        # Skip the data rows already handed out, keeping the header line
+        yield from pd.read_csv(file_path, encoding='latin-1', chunksize=CSV_CHUNK_SIZE,
+                               skiprows=range(1, rows_read + 1))
+
+def _parse_list_field(value):
+    """Convert a string representation of a list to an actual list."""
+    if not value:
+        return []
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        # Handle non-standard list formats or strings
+        items = value.replace('[', '').replace(']', '').split(',')
+        return [item.strip() for item in items if item.strip()]
+
+def _customer_from_row(row: dict) -> dict:
+    """Build a customer record from a CSV row."""
+    return {
+        'customer_id': str(row['Customer_ID']),  # Convert to string to ensure consistency
+        'age': row['Age'],
+        'gender': str(row['Gender']),
+        'location': str(row['Location']),
+        'browsing_history': _parse_list_field(row.get('Browsing_History')),
+        'purchase_history': _parse_list_field(row.get('Purchase_History')),
+        'customer_segment': str(row['Customer_Segment']),
+        'avg_order_value': row['Avg_Order_Value']
+    }
+
+def _product_from_row(row: dict) -> dict:
+    """Build a product record from a CSV row."""
+    return {
+        'product_id': str(row['Product_ID']),  # Convert to string to ensure consistency
+        'category': str(row['Category']),
+        'subcategory': str(row['Subcategory']),
+        'price': row['Price'],
+        'brand': str(row['Brand']),
+        'avg_rating': row['Average_Rating_of_Similar_Products'],
+        'product_rating': row['Product_Rating'],
+        'sentiment_score': row['Customer_Review_Sentiment_Score']
+    }
+
+def _load_csv_pipeline(db: Database, file_path: Path, label: str, id_column: str,
+                       build_record: Callable[[dict], dict],
+                       insert_batch: Callable[[List[dict]], None]) -> int:
+    """Stream a CSV file into the database with a reader and a writer thread.
+    
+    The reader thread parses the CSV in chunks and converts rows to records,
+    while the writer thread drains a bounded queue into bulk inserts, so
+    pandas parsing overlaps with SQLite commits.
+    
+    Args:
+        db: Database instance used by the writer thread
+        file_path: Path to the CSV file
+        label: Human-readable record type for log messages
+        id_column: CSV column holding the record identifier
+        build_record: Function converting a CSV row dict into a record
+        insert_batch: Function inserting a list of records
+        
+    Returns:
+        Number of records handed to the writer
+    """
+    encoding = _detect_encoding(file_path)
+    batches = queue.Queue(maxsize=QUEUE_MAX_BATCHES)
+    stop = threading.Event()
+    
+    def reader():
+        count = 0
+        try:
+            for chunk in _iter_csv_chunks(file_path, encoding):
+                records = []
+                for row in chunk.to_dict('records'):
+                    try:
+                        records.append(build_record(row))
+                    except Exception as e:
+                        print(f"Error processing {label} {row.get(id_column, 'unknown')}: {e}")
+                count += len(records)
+                # Stop producing if the writer has failed
+                while not stop.is_set():
+                    try:
+                        batches.put(records, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    break
+        finally:
+            batches.put(None)
+        return count
+    
+    def insert_records(records):
+        try:
+            insert_batch(records)
+        except sqlite3.Error as e:
+            # Discard the rows written before the failure, then retry row by row so one bad record only skips itself
+            db.conn.rollback()
+            print(f"Batch insert of {len(records)} {label} records failed ({e}); retrying row by row...")
+            for record in records:
+                try:
+                    insert_batch([record])
+                except sqlite3.Error as row_error:
+                    print(f"Error inserting {label} {record.get(f'{label}_id', 'unknown')}: {row_error}")
+    
+    def writer():
+        try:
+            # SQLite connections are bound to the thread that opened them
+            db.connect()
+            # One tick per batch; throttle redraws and skip them entirely off-TTY
+            with tqdm(unit=label, mininterval=0.5, smoothing=0.1, disable=None) as progress:
+                while True:
+                    records = batches.get()
+                    if records is None:
+                        break
+                    if records:
+                        insert_records(records)
+                    progress.update(len(records))
+        except Exception:
+            stop.set()
+            # Drain the queue so the reader is never blocked on a full queue
+            while batches.get() is not None:
+                pass
+            raise
+        finally:
+            db.close()
+    
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        reader_future = executor.submit(reader)
+        writer_future = executor.submit(writer)
+        writer_future.result()
+        return reader_future.result()
+
 def load_customer_data(db: Database, file_path: Path):
     """Load customer data from CSV file into the database.
     
@@ -24,73 +211,16 @@ def load_customer_data(db: Database, file_path: Path):
     """
     print(f"Loading customer data from {file_path}...")
     
-    # Read the CSV file with explicit encoding options
     try:
-        # Try multiple encodings in order
-        encodings = ['ascii', 'utf-8', 'latin-1']
-        df = None
-        
-        for encoding in encodings:
-            try:
-                print(f"Attempting to read with {encoding} encoding...")
-                df = pd.read_csv(file_path, encoding=encoding)
-                print(f"Successfully loaded with {encoding} encoding.")
-                break
-            except UnicodeDecodeError:
-                print(f"Failed to read with {encoding} encoding.")
-                continue
-        
-        if df is None:
-            # Last resort: read with latin-1 which should handle any byte values
-            print(f"Using latin-1 encoding as fallback...")
-            df = pd.read_csv(file_path, encoding='latin-1')
-        
-        print(f"Loaded {len(df)} customer records.")
+        count = _load_csv_pipeline(
+            db, file_path, "customer", "Customer_ID",
+            _customer_from_row, db.insert_customers_bulk
+        )
     except Exception as e:
         print(f"Error loading customer data: {e}")
         return
     
-    # Process and insert each customer record
-    for _, row in tqdm(df.iterrows(), total=len(df)):
-        try:
-            # Convert string representations of lists to actual lists
-            browsing_history = []
-            purchase_history = []
-            
-            if 'Browsing_History' in row and row['Browsing_History']:
-                try:
-                    browsing_history = ast.literal_eval(row['Browsing_History'])
-                except (ValueError, SyntaxError):
-                    # Handle non-standard list formats or strings
-                    browsing_history = row['Browsing_History'].replace('[', '').replace(']', '').split(',')
-                    browsing_history = [item.strip() for item in browsing_history if item.strip()]
-            
-            if 'Purchase_History' in row and row['Purchase_History']:
-                try:
-                    purchase_history = ast.literal_eval(row['Purchase_History'])
-                except (ValueError, SyntaxError):
-                    # Handle non-standard list formats or strings
-                    purchase_history = row['Purchase_History'].replace('[', '').replace(']', '').split(',')
-                    purchase_history = [item.strip() for item in purchase_history if item.strip()]
-            
-            # Create customer record
-            customer_data = {
-                'customer_id': str(row['Customer_ID']),  # Convert to string to ensure consistency
-                'age': row['Age'],
-                'gender': str(row['Gender']),
-                'location': str(row['Location']),
-                'browsing_history': browsing_history,
-                'purchase_history': purchase_history,
-                'customer_segment': str(row['Customer_Segment']),
-                'avg_order_value': row['Avg_Order_Value']
-            }
-            
-            # Insert into database
-            db.insert_customer(customer_data)
-            
-        except Exception as e:
-            print(f"Error processing customer {row.get('Customer_ID', 'unknown')}: {e}")
-    
+    print(f"Loaded {count} customer records.")
     print("Customer data loaded successfully.")
 
 def load_product_data(db: Database, file_path: Path):
@@ -102,53 +232,16 @@ def load_product_data(db: Database, file_path: Path):
     """
     print(f"Loading product data from {file_path}...")
     
-    # Read the CSV file with explicit encoding options
     try:
-        # Try multiple encodings in order
-        encodings = ['ascii', 'utf-8', 'latin-1']
-        df = None
-        
-        for encoding in encodings:
-            try:
-                print(f"Attempting to read with {encoding} encoding...")
-                df = pd.read_csv(file_path, encoding=encoding)
-                print(f"Successfully loaded with {encoding} encoding.")
-                break
-            except UnicodeDecodeError:
-                print(f"Failed to read with {encoding} encoding.")
-                continue
-        
-        if df is None:
-            # Last resort: read with latin-1 which should handle any byte values
-            print(f"Using latin-1 encoding as fallback...")
-            df = pd.read_csv(file_path, encoding='latin-1')
-        
-        print(f"Loaded {len(df)} product records.")
+        count = _load_csv_pipeline(
+            db, file_path, "product", "Product_ID",
+            _product_from_row, db.insert_products_bulk
+        )
     except Exception as e:
         print(f"Error loading product data: {e}")
         return
     
-    # Process and insert each product record
-    for _, row in tqdm(df.iterrows(), total=len(df)):
-        try:
-            # Create product record
-            product_data = {
-                'product_id': str(row['Product_ID']),  # Convert to string to ensure consistency
-                'category': str(row['Category']),
-                'subcategory': str(row['Subcategory']),
-                'price': row['Price'],
-                'brand': str(row['Brand']),
-                'avg_rating': row['Average_Rating_of_Similar_Products'],
-                'product_rating': row['Product_Rating'],
-                'sentiment_score': row['Customer_Review_Sentiment_Score']
-            }
-            
-            # Insert into database
-            db.insert_product(product_data)
-            
-        except Exception as e:
-            print(f"Error processing product {row.get('Product_ID', 'unknown')}: {e}")
-    
+    print(f"Loaded {count} product records.")
     print("Product data loaded successfully.")
 
 def load_all_data():
@@ -156,21 +249,30 @@ def load_all_data():
     print("Initializing database...")
     init_db()
     
-    db = Database()
-    
-    # Load customer data
-    if CUSTOMER_DATA_PATH.exists():
-        load_customer_data(db, CUSTOMER_DATA_PATH)
-    else:
-        print(f"Customer data file not found: {CUSTOMER_DATA_PATH}")
-    
-    # Load product data
-    if PRODUCT_DATA_PATH.exists():
-        load_product_data(db, PRODUCT_DATA_PATH)
-    else:
-        print(f"Product data file not found: {PRODUCT_DATA_PATH}")
+    # Customers and products live in different tables, so load them concurrently,
+    # each with its own connection
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = []
+        
+        # Load customer data
+        if CUSTOMER_DATA_PATH.exists():
+            futures.append(executor.submit(load_customer_data, Database(), CUSTOMER_DATA_PATH))
+        else:
+            print(f"Customer data file not found: {CUSTOMER_DATA_PATH}")
+        
+        # Load product data
+        if PRODUCT_DATA_PATH.exists():
+            futures.append(executor.submit(load_product_data, Database(), PRODUCT_DATA_PATH))
+        else:
+            print(f"Product data file not found: {PRODUCT_DATA_PATH}")
+        
+        for future in futures:
+            future.result()
     
-    # Close the database connection
+    # Refresh planner statistics so the new indexes are used, and resync the row counters
+    db = Database()
+    db.analyze()
+    db.refresh_counters()
     db.close()
     
     print("Data loading complete.")
@@ -279,14 +381,6 @@ def create_sample_data():
         }
     ]
     
-    # Insert sample customers
-    for customer in sample_customers:
-        db.insert_customer(customer)
-    
-    # Insert sample products
-    for product in sample_products:
-        db.insert_product(product)
-    
     # Create some sample recommendations
     sample_recommendations = [
         {
@@ -321,9 +415,11 @@ def create_sample_data():
         }
     ]
     
-    # Insert sample recommendations
-    for recommendation in sample_recommendations:
-        db.insert_recommendation(recommendation)
+    # Insert all sample data in a single transaction
+    with db.transaction():
+        db.insert_customers_bulk(sample_customers)
+        db.insert_products_bulk(sample_products)
+        db.insert_recommendations_bulk(sample_recommendations)
     
     # Close the database connection
     db.close()
@@ -0,0 +1,79 @@
+"""
+Background job queue for long-running agent analyses
+"""
+
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Number of analyses that can run at the same time
+JOB_WORKERS = int(os.environ.get('SMARTSHOP_JOB_WORKERS', 4))
+# Seconds a finished job's result is kept for polling
+JOB_RESULT_TTL = 3600
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="smartshop-job")
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+def _run_job(job_id, func, args, kwargs):
+    """Run a job's function and record its outcome."""
+    job = _jobs[job_id]
+    job["state"] = "running"
+    try:
+        job["result"] = func(*args, **kwargs)
+        job["state"] = "finished"
+    except Exception as e:
+        job["error"] = str(e)
+        job["state"] = "failed"
+    job["finished_at"] = time.time()
+
+def _prune_jobs():
+    """Drop finished jobs whose results have expired."""
+    cutoff = time.time() - JOB_RESULT_TTL
+    with _jobs_lock:
+        expired = [job_id for job_id, job in _jobs.items()
+                   if job["finished_at"] is not None and job["finished_at"] < cutoff]
+        for job_id in expired:
+            del _jobs[job_id]
+
+def submit_job(kind, func, *args, **kwargs):
+    """Queue a function to run in the background.
+    
+    Args:
+        kind: Name of the kind of job, used by callers to present its result
+        func: Function to run
+        *args: Positional arguments for func
+        **kwargs: Keyword arguments for func
+    
+    Returns:
+        The new job's ID
+    """
+    _prune_jobs()
+    
+    job_id = uuid.uuid4().hex
+    with _jobs_lock:
+        _jobs[job_id] = {
+            "id": job_id,
+            "kind": kind,
+            "state": "pending",
+            "result": None,
+            "error": None,
+            "submitted_at": time.time(),
+            "finished_at": None
+        }
+    _executor.submit(_run_job, job_id, func, args, kwargs)
+    return job_id
+
+def get_job(job_id):
+    """Get a job's current state.
+    
+    Args:
+        job_id: ID returned by submit_job
+    
+    Returns:
+        Copy of the job record (state is pending, running, finished or failed), or None if unknown
+    """
+    job = _jobs.get(job_id)
+    return dict(job) if job is not None else None
@@ -3,8 +3,14 @@ Database utility module for SQLite operations
 """
 
 import sqlite3
-import pandas as pd
+import numpy as np
 import json
+import threading
+import weakref
+from contextlib import contextmanager
+from functools import partial
+from itertools import islice
+from operator import itemgetter
 from pathlib import Path
 import sys
 import os
@@ -13,15 +19,147 @@ import os
 sys.path.append(str(Path(__file__).parent.parent.parent))
 from smartshop.config import DB_PATH, DATA_DIR
 
+# Use orjson for the JSON list columns when it is installed
+try:
+    import orjson
+    
+    def _json_dumps(value):
+        return orjson.dumps(value).decode()
+    
+    _json_loads = orjson.loads
+except ImportError:
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+
+# Maximum number of rows sent to SQLite per executemany call in bulk inserts
+BULK_CHUNK_SIZE = 10000
+
+# Per-connection PRAGMAs applied on every connect (journal_mode=WAL is persisted
+# in the database file by init_db). NORMAL sync is durable under WAL and avoids
+# an fsync per commit.
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",  # 64 MiB page cache
+    "PRAGMA mmap_size = 268435456",  # 256 MiB memory-mapped I/O
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA wal_autocheckpoint = 1000",
+    # Make INSERT OR REPLACE fire the DELETE triggers that keep the row counters exact
+    "PRAGMA recursive_triggers = ON",
+)
+
+# Tables whose row counts are maintained in the counters table
+COUNTED_TABLES = ('customers', 'products')
+
+# Insert statements for the hot write paths, kept as constant strings so
+# sqlite3's per-connection statement cache always hits
+_SQL_INSERT_CUSTOMER = (
+    "INSERT OR REPLACE INTO customers "
+    "(customer_id, age, gender, location, browsing_history, purchase_history, "
+    "customer_segment, avg_order_value, updated_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)"
+)
+_SQL_INSERT_PRODUCT = (
+    "INSERT OR REPLACE INTO products "
+    "(product_id, category, subcategory, price, brand, "
+    "avg_rating, product_rating, sentiment_score, updated_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)"
+)
+_SQL_INSERT_RECOMMENDATION = (
+    "INSERT INTO recommendations "
+    "(customer_id, product_id, score, recommended_at) "
+    "VALUES (?, ?, ?, CURRENT_TIMESTAMP)"
+)
+_SQL_INSERT_INTERACTION = (
+    "INSERT INTO interactions "
+    "(customer_id, product_id, interaction_type, value, interaction_time) "
+    "VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)"
+)
+_SQL_INSERT_MEMORY = (
+    "INSERT OR REPLACE INTO agent_memory "
+    "(agent_id, memory_type, memory_key, memory_value, embedding, updated_at) "
+    "VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)"
+)
+
+# Record fields bound to the insert statements above, in parameter order
+_CUSTOMER_COLUMNS = ('customer_id', 'age', 'gender', 'location', 'browsing_history',
+                     'purchase_history', 'customer_segment', 'avg_order_value')
+_PRODUCT_COLUMNS = ('product_id', 'category', 'subcategory', 'price', 'brand',
+                    'avg_rating', 'product_rating', 'sentiment_score')
+_RECOMMENDATION_COLUMNS = ('customer_id', 'product_id', 'score')
+_INTERACTION_COLUMNS = ('customer_id', 'product_id', 'interaction_type', 'value')
+_MEMORY_COLUMNS = ('agent_id', 'memory_type', 'memory_key', 'memory_value', 'embedding')
+
+_CUSTOMER_FIELDS = itemgetter(*_CUSTOMER_COLUMNS)
+_PRODUCT_FIELDS = itemgetter(*_PRODUCT_COLUMNS)
+_RECOMMENDATION_FIELDS = itemgetter(*_RECOMMENDATION_COLUMNS)
+_INTERACTION_FIELDS = itemgetter(*_INTERACTION_COLUMNS)
+_MEMORY_FIELDS = itemgetter(*_MEMORY_COLUMNS)
+
+def _embedding_blob(embedding):
+    """Encode an embedding as a raw float32 buffer for the agent_memory BLOB column."""
+    if embedding is None or isinstance(embedding, (bytes, memoryview)):
+        return embedding
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+def _record_values(fields, columns, record):
+    """Extract a record's values in column order, using None for missing keys."""
+    try:
+        return fields(record)
+    except KeyError:
+        return tuple(record.get(col) for col in columns)
+
+class _ThreadConnection:
+    """A thread's connection and cursor; conn is None once the connection is closed."""
+    
+    __slots__ = ('conn', 'cursor', '__weakref__')
+    
+    def __init__(self, conn, cursor):
+        self.conn = conn
+        self.cursor = cursor
+
 class Database:
     """Database manager for SmartShop application."""
     
-    def __init__(self, db_path=DB_PATH):
-        """Initialize the database connection."""
+    def __init__(self, db_path=DB_PATH, max_idle=0):
+        """Initialize the database connection.
+        
+        Args:
+            db_path: Path to the SQLite database file
+            max_idle: Number of released connections kept open for reuse by other threads
+        """
         self.db_path = db_path
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        self.conn = None
-        self.cursor = None
+        self._columns = {}
+        self._tx = threading.local()
+        # One connection per thread, reused for the thread's lifetime and dropped with it
+        self._local = threading.local()
+        # Every open connection, tracked weakly so close_all() can reach other threads'
+        self._open = weakref.WeakSet()
+        self._connections_lock = threading.Lock()
+        # Connections handed back with release(), ready for the next thread
+        self.max_idle = max_idle
+        self._idle = []
+    
+    def _current(self):
+        """The current thread's open connection entry, or None."""
+        entry = getattr(self._local, 'entry', None)
+        return entry if entry is not None and entry.conn is not None else None
+    
+    @property
+    def conn(self):
+        """The current thread's connection, opened on first use."""
+        entry = self._current()
+        return entry.conn if entry is not None else self.connect()
+    
+    @property
+    def cursor(self):
+        """The current thread's cursor, opened on first use."""
+        entry = self._current()
+        if entry is None:
+            self.connect()
+            entry = self._local.entry
+        return entry.cursor
     
     def check_connection(self):
         """Check if the database exists and is accessible."""
@@ -35,59 +173,158 @@ class Database:
         return False
     
     def connect(self):
-        """Connect to the SQLite database."""
-        self.conn = sqlite3.connect(self.db_path)
-        # Set text_factory to handle binary data correctly
-        self.conn.text_factory = lambda b: b.decode('utf-8', errors='replace')
-        self.cursor = self.conn.cursor()
-        return self.conn
+        """Connect to the SQLite database.
+        
+        Each thread gets its own connection, opened on first use and kept open
+        so SQLite's page and statement caches survive across queries.
+        """
+        entry = self._current()
+        if entry is not None:
+            return entry.conn
+        
+        # Reuse a released connection before opening a new one
+        with self._connections_lock:
+            entry = self._idle.pop() if self._idle else None
+        
+        if entry is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=512)
+            # Set text_factory to handle binary data correctly
+            conn.text_factory = lambda b: b.decode('utf-8', errors='replace')
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            entry = _ThreadConnection(conn, conn.cursor())
+            with self._connections_lock:
+                self._open.add(entry)
+        
+        self._local.entry = entry
+        return entry.conn
+    
+    def release(self):
+        """Hand the current thread's connection back for reuse by other threads.
+        
+        Any uncommitted work is rolled back. The connection is closed instead
+        if max_idle connections are already waiting.
+        """
+        entry = self._current()
+        self._local.entry = None
+        if entry is None:
+            return
+        
+        if entry.conn.in_transaction:
+            entry.conn.rollback()
+        
+        with self._connections_lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(entry)
+                return
+        self._close_entry(entry)
     
     def close(self):
-        """Close the database connection."""
-        if self.conn:
-            self.conn.close()
-            self.conn = None
-            self.cursor = None
+        """Close the current thread's database connection."""
+        entry = self._current()
+        self._local.entry = None
+        if entry is not None:
+            self._close_entry(entry)
+    
+    def close_all(self):
+        """Close the database connections of all threads, including idle ones."""
+        with self._connections_lock:
+            entries = list(self._open)
+            self._open.clear()
+            self._idle = []
+        for entry in entries:
+            self._close_entry(entry)
+    
+    @staticmethod
+    def _close_entry(entry):
+        """Close a connection entry, marking it closed for the thread that owns it."""
+        conn, entry.conn = entry.conn, None
+        if conn is not None:
+            conn.close()
+    
+    @contextmanager
+    def transaction(self):
+        """Group several statements into one transaction.
+        
+        Commits requested by execute/executemany inside the block are deferred
+        until the outermost block exits; the transaction is rolled back if the
+        block raises.
+        """
+        depth = getattr(self._tx, 'depth', 0)
+        self._tx.depth = depth + 1
+        try:
+            yield self
+        except BaseException:
+            if depth == 0:
+                self.conn.rollback()
+            raise
+        else:
+            if depth == 0:
+                self.conn.commit()
+        finally:
+            self._tx.depth = depth
+    
+    def _in_transaction(self):
+        """Check whether the current thread is inside a transaction() block."""
+        return getattr(self._tx, 'depth', 0) > 0
     
     def execute(self, query, params=None, commit=False):
         """Execute a SQL query."""
-        if not self.conn:
-            self.connect()
-        
         if params:
             result = self.cursor.execute(query, params)
         else:
             result = self.cursor.execute(query)
         
-        if commit:
+        if commit and not self._in_transaction():
             self.conn.commit()
         
         return result
     
     def executemany(self, query, params_list, commit=True):
         """Execute a SQL query with multiple parameter sets."""
-        if not self.conn:
-            self.connect()
-        
         self.cursor.executemany(query, params_list)
         
-        if commit:
+        if commit and not self._in_transaction():
             self.conn.commit()
     
+    def executemany_chunked(self, query, params_iter, chunk_size=BULK_CHUNK_SIZE):
+        """Execute a SQL query over many parameter sets in a single transaction.
+        
+        Parameter sets are consumed lazily and sent to SQLite in chunks of
+        chunk_size rows, with one commit at the end. If any chunk fails, the
+        whole batch is rolled back (or the enclosing transaction() block is).
+        """
+        params_iter = iter(params_iter)
+        with self.transaction():
+            while True:
+                chunk = list(islice(params_iter, chunk_size))
+                if not chunk:
+                    break
+                self.cursor.executemany(query, chunk)
+    
     def fetch_all(self, query, params=None):
         """Execute a query and fetch all results."""
         self.execute(query, params)
         return self.cursor.fetchall()
     
+    def iter_batches(self, query, params=None, batch_size=1000):
+        """Execute a query and return an iterator over lists of up to batch_size rows.
+        
+        The query runs immediately, so errors surface here; each batch is
+        fetched as the iterator is consumed.
+        """
+        cur = self.conn.execute(query, params or ())
+        return iter(partial(cur.fetchmany, batch_size), [])
+    
     def fetch_one(self, query, params=None):
         """Execute a query and fetch one result."""
-        self.execute(query, params)
-        return self.cursor.fetchone()
+        # Connection.execute uses a transient cursor and the connection's statement cache
+        return self.conn.execute(query, params or ()).fetchone()
     
     def fetch_df(self, query, params=None):
         """Execute a query and return results as a DataFrame."""
-        if not self.conn:
-            self.connect()
+        # pandas is only needed here, so it is imported on first use
+        import pandas as pd
         
         if params:
             return pd.read_sql_query(query, self.conn, params=params)
@@ -175,96 +412,187 @@ class Database:
         )
         """, commit=True)
         
+        # Create embedding_cache table (embeddings keyed by a hash of model and text)
+        self.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            hash BLOB PRIMARY KEY,
+            embedding BLOB
+        )
+        """, commit=True)
+        
         # Create index for memory retrieval
         self.execute("""
         CREATE INDEX IF NOT EXISTS idx_agent_memory_agent_id_memory_type
         ON agent_memory (agent_id, memory_type)
         """, commit=True)
+        
+        # Create index for per-customer recommendation lookups, in result order
+        self.execute("""
+        CREATE INDEX IF NOT EXISTS idx_rec_customer_score
+        ON recommendations (customer_id, score DESC, recommended_at DESC)
+        """, commit=True)
+        
+        # Create index for similar-customer lookups
+        self.execute("""
+        CREATE INDEX IF NOT EXISTS idx_cust_seg_loc_age
+        ON customers (customer_segment, location, age)
+        """, commit=True)
+        
+        # Create index for category-filtered, category-ordered product listings;
+        # product_id makes the order total so paged exports are stable
+        self.execute("DROP INDEX IF EXISTS idx_products_cat_subcat", commit=True)
+        self.execute("""
+        CREATE INDEX IF NOT EXISTS idx_products_cat_subcat_id
+        ON products (category, subcategory, product_id)
+        """, commit=True)
+        
+        # Create index for per-customer interaction history
+        self.execute("""
+        CREATE INDEX IF NOT EXISTS idx_interactions_cust
+        ON interactions (customer_id, interaction_time DESC)
+        """, commit=True)
+        
+        # Create counters table (row counts kept up to date by triggers)
+        self.execute("""
+        CREATE TABLE IF NOT EXISTS counters (
+            table_name TEXT PRIMARY KEY,
+            n INTEGER NOT NULL DEFAULT 0
+        )
+        """, commit=True)
+        
+        for table in COUNTED_TABLES:
+            self.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_count_insert AFTER INSERT ON {table}
+            BEGIN
+                UPDATE counters SET n = n + 1 WHERE table_name = '{table}';
+            END
+            """, commit=True)
+            self.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_count_delete AFTER DELETE ON {table}
+            BEGIN
+                UPDATE counters SET n = n - 1 WHERE table_name = '{table}';
+            END
+            """, commit=True)
+        
+        self.refresh_counters()
+    
+    def refresh_counters(self):
+        """Recompute the stored row counts from the tables themselves."""
+        with self.transaction():
+            for table in COUNTED_TABLES:
+                self.execute(
+                    f"INSERT OR REPLACE INTO counters (table_name, n) VALUES (?, (SELECT COUNT(*) FROM {table}))",
+                    (table,),
+                    commit=True
+                )
+    
+    def get_row_counts(self):
+        """Get the stored row counts of the counted tables.
+        
+        Returns:
+            Dictionary mapping table name to row count
+        """
+        return dict(self.fetch_all("SELECT table_name, n FROM counters"))
+    
+    def fix_text_encoding(self, tables=COUNTED_TABLES):
+        """Convert binary values stored in TEXT columns to text.
+        
+        Blobs that are valid UTF-8 are cast to TEXT in place; any others are
+        transcoded from latin-1 to UTF-8. Both are written back in batches
+        inside a single transaction.
+        
+        Args:
+            tables: Tables whose TEXT columns are checked
+            
+        Returns:
+            Number of values converted
+        """
+        fixed = 0
+        with self.transaction():
+            for table in tables:
+                columns = [row[1] for row in self.fetch_all(f"PRAGMA table_info({table})") if row[2].upper() == 'TEXT']
+                for column in columns:
+                    blobs = self.fetch_all(f"SELECT rowid, {column} FROM {table} WHERE typeof({column}) = 'blob'")
+                    valid, transcoded = [], []
+                    for rowid, value in blobs:
+                        try:
+                            value.decode('utf-8')
+                            valid.append((rowid,))
+                        except UnicodeDecodeError:
+                            # latin-1 maps every byte, so the original characters are kept
+                            transcoded.append((value.decode('latin-1'), rowid))
+                    
+                    if valid:
+                        self.executemany(f"UPDATE {table} SET {column} = CAST({column} AS TEXT) WHERE rowid = ?", valid)
+                    if transcoded:
+                        self.executemany(f"UPDATE {table} SET {column} = ? WHERE rowid = ?", transcoded)
+                    fixed += len(blobs)
+        return fixed
+    
+    def analyze(self):
+        """Refresh the query planner statistics after bulk loads."""
+        self.execute("ANALYZE", commit=True)
     
     def insert_customer(self, customer_data):
         """Insert or update a customer in the database."""
-        # Convert list fields to JSON strings
-        if isinstance(customer_data.get('browsing_history', []), list):
-            customer_data['browsing_history'] = json.dumps(customer_data['browsing_history'])
-        if isinstance(customer_data.get('purchase_history', []), list):
-            customer_data['purchase_history'] = json.dumps(customer_data['purchase_history'])
+        self.insert_customers_bulk([customer_data])
+    
+    def insert_customers_bulk(self, customers):
+        """Insert or update a batch of customers in a single transaction."""
+        def to_params(c):
+            (customer_id, age, gender, location, browsing_history, purchase_history,
+             customer_segment, avg_order_value) = _record_values(_CUSTOMER_FIELDS, _CUSTOMER_COLUMNS, c)
+            # Convert list fields to JSON strings
+            if isinstance(browsing_history, list):
+                browsing_history = _json_dumps(browsing_history)
+            if isinstance(purchase_history, list):
+                purchase_history = _json_dumps(purchase_history)
+            return (customer_id, age, gender, location, browsing_history, purchase_history,
+                    customer_segment, avg_order_value)
         
-        query = """
-        INSERT OR REPLACE INTO customers 
-        (customer_id, age, gender, location, browsing_history, purchase_history, 
-         customer_segment, avg_order_value, updated_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-        """
-        params = (
-            customer_data.get('customer_id'),
-            customer_data.get('age'),
-            customer_data.get('gender'),
-            customer_data.get('location'),
-            customer_data.get('browsing_history'),
-            customer_data.get('purchase_history'),
-            customer_data.get('customer_segment'),
-            customer_data.get('avg_order_value')
-        )
-        self.execute(query, params, commit=True)
+        self.executemany_chunked(_SQL_INSERT_CUSTOMER, map(to_params, customers))
     
     def insert_product(self, product_data):
         """Insert or update a product in the database."""
-        query = """
-        INSERT OR REPLACE INTO products 
-        (product_id, category, subcategory, price, brand,
-         avg_rating, product_rating, sentiment_score, updated_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-        """
-        params = (
-            product_data.get('product_id'),
-            product_data.get('category'),
-            product_data.get('subcategory'),
-            product_data.get('price'),
-            product_data.get('brand'),
-            product_data.get('avg_rating'),
-            product_data.get('product_rating'),
-            product_data.get('sentiment_score')
-        )
-        self.execute(query, params, commit=True)
+        self.insert_products_bulk([product_data])
+    
+    def insert_products_bulk(self, products):
+        """Insert or update a batch of products in a single transaction."""
+        params_iter = (_record_values(_PRODUCT_FIELDS, _PRODUCT_COLUMNS, p) for p in products)
+        self.executemany_chunked(_SQL_INSERT_PRODUCT, params_iter)
     
     def insert_recommendation(self, recommendation_data):
         """Insert a recommendation in the database."""
-        query = """
-        INSERT INTO recommendations 
-        (customer_id, product_id, score, recommended_at)
-        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-        """
-        params = (
-            recommendation_data.get('customer_id'),
-            recommendation_data.get('product_id'),
-            recommendation_data.get('score')
-        )
-        self.execute(query, params, commit=True)
+        self.insert_recommendations_bulk([recommendation_data])
+    
+    def insert_recommendations_bulk(self, recommendations):
+        """Insert a batch of recommendations in a single transaction."""
+        params_iter = (_record_values(_RECOMMENDATION_FIELDS, _RECOMMENDATION_COLUMNS, r) for r in recommendations)
+        self.executemany_chunked(_SQL_INSERT_RECOMMENDATION, params_iter)
     
     def insert_interaction(self, interaction_data):
         """Insert an interaction in the database."""
-        query = """
-        INSERT INTO interactions 
-        (customer_id, product_id, interaction_type, value, interaction_time)
-        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-        """
-        params = (
-            interaction_data.get('customer_id'),
-            interaction_data.get('product_id'),
-            interaction_data.get('interaction_type'),
-            interaction_data.get('value')
-        )
-        self.execute(query, params, commit=True)
+        self.insert_interactions_bulk([interaction_data])
+    
+    def insert_interactions_bulk(self, interactions):
+        """Insert a batch of interactions in a single transaction."""
+        params_iter = (_record_values(_INTERACTION_FIELDS, _INTERACTION_COLUMNS, i) for i in interactions)
+        self.executemany_chunked(_SQL_INSERT_INTERACTION, params_iter)
     
     def store_memory(self, agent_id, memory_type, memory_key, memory_value, embedding=None):
         """Store agent memory in the database."""
-        query = """
-        INSERT OR REPLACE INTO agent_memory 
-        (agent_id, memory_type, memory_key, memory_value, embedding, updated_at)
-        VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-        """
-        params = (agent_id, memory_type, memory_key, memory_value, embedding)
-        self.execute(query, params, commit=True)
+        self.executemany_chunked(
+            _SQL_INSERT_MEMORY,
+            [(agent_id, memory_type, memory_key, memory_value, _embedding_blob(embedding))]
+        )
+    
+    def store_memories_bulk(self, memories):
+        """Store a batch of agent memories in a single transaction."""
+        params_iter = (
+            _record_values(_MEMORY_FIELDS, _MEMORY_COLUMNS, m)[:-1] + (_embedding_blob(m.get('embedding')),)
+            for m in memories
+        )
+        self.executemany_chunked(_SQL_INSERT_MEMORY, params_iter)
     
     def retrieve_memory(self, agent_id, memory_type, memory_key=None):
         """Retrieve agent memory from the database."""
@@ -283,44 +611,52 @@ class Database:
         
         return result
     
+    def get_cached_embedding(self, key):
+        """Look up a cached embedding by its hash key.
+        
+        Returns:
+            A read-only float32 numpy view over the cached buffer, or None on a miss
+        """
+        result = self.fetch_one("SELECT embedding FROM embedding_cache WHERE hash = ?", (key,))
+        
+        if not result:
+            return None
+        
+        return np.frombuffer(result[0], dtype=np.float32)
+    
+    def store_cached_embedding(self, key, embedding):
+        """Store an embedding in the cache under its hash key."""
+        self.execute(
+            "INSERT OR REPLACE INTO embedding_cache (hash, embedding) VALUES (?, ?)",
+            (key, _embedding_blob(embedding)),
+            commit=True
+        )
+    
+    def _fetch_one_dict(self, query, params):
+        """Execute a query and fetch one result as a dict, caching the column names per query."""
+        cur = self.conn.execute(query, params)
+        row = cur.fetchone()
+        if row is None:
+            return None
+        
+        columns = self._columns.get(query)
+        if columns is None:
+            columns = self._columns[query] = [desc[0] for desc in cur.description]
+        return dict(zip(columns, row))
+    
     def get_customer(self, customer_id):
         """Get customer data by ID."""
         query = "SELECT * FROM customers WHERE customer_id = ?"
-        result = self.fetch_one(query, (customer_id,))
+        # Text columns are already decoded by the connection's text_factory
+        customer_dict = self._fetch_one_dict(query, (customer_id,))
         
-        if result:
-            # Convert column names and result to dict
-            columns = [desc[0] for desc in self.cursor.description]
-            customer_dict = {}
-            
-            # Safely handle potentially binary data when creating the dictionary
-            for i, col in enumerate(columns):
-                if isinstance(result[i], bytes):
-                    try:
-                        # First try UTF-8
-                        customer_dict[col] = result[i].decode('utf-8')
-                    except UnicodeDecodeError:
-                        try:
-                            # Try with 'latin-1' which can decode any byte value
-                            customer_dict[col] = result[i].decode('latin-1')
-                        except Exception:
-                            try:
-                                # Try with 'ascii' and ignore errors
-                                customer_dict[col] = result[i].decode('ascii', errors='ignore')
-                            except Exception:
-                                # Last resort: represent as hex
-                                customer_dict[col] = f"[Binary: {result[i].hex()[:10]}...]"
-                else:
-                    customer_dict[col] = result[i]
-            
+        if customer_dict:
             # Parse JSON fields
             try:
                 if customer_dict.get('browsing_history') and not isinstance(customer_dict['browsing_history'], list):
-                    if not customer_dict['browsing_history'].startswith("[Binary:"):
-                        customer_dict['browsing_history'] = json.loads(customer_dict['browsing_history'])
+                    customer_dict['browsing_history'] = _json_loads(customer_dict['browsing_history'])
                 if customer_dict.get('purchase_history') and not isinstance(customer_dict['purchase_history'], list):
-                    if not customer_dict['purchase_history'].startswith("[Binary:"):
-                        customer_dict['purchase_history'] = json.loads(customer_dict['purchase_history'])
+                    customer_dict['purchase_history'] = _json_loads(customer_dict['purchase_history'])
             except json.JSONDecodeError:
                 # Set to empty lists if JSON parsing fails
                 if 'browsing_history' in customer_dict:
@@ -335,36 +671,8 @@ class Database:
     def get_product(self, product_id):
         """Get product data by ID."""
         query = "SELECT * FROM products WHERE product_id = ?"
-        result = self.fetch_one(query, (product_id,))
-        
-        if result:
-            # Convert column names and result to dict
-            columns = [desc[0] for desc in self.cursor.description]
-            product_dict = {}
-            
-            # Safely handle potentially binary data when creating the dictionary
-            for i, col in enumerate(columns):
-                if isinstance(result[i], bytes):
-                    try:
-                        # First try UTF-8
-                        product_dict[col] = result[i].decode('utf-8')
-                    except UnicodeDecodeError:
-                        try:
-                            # Try with 'latin-1' which can decode any byte value
-                            product_dict[col] = result[i].decode('latin-1')
-                        except Exception:
-                            try:
-                                # Try with 'ascii' and ignore errors
-                                product_dict[col] = result[i].decode('ascii', errors='ignore')
-                            except Exception:
-                                # Last resort: represent as hex
-                                product_dict[col] = f"[Binary: {result[i].hex()[:10]}...]"
-                else:
-                    product_dict[col] = result[i]
-            
-            return product_dict
-        
-        return None
+        # Text columns are already decoded by the connection's text_factory
+        return self._fetch_one_dict(query, (product_id,))
     
     def get_customer_recommendations(self, customer_id, limit=5):
         """Get recommendations for a specific customer."""
@@ -377,85 +685,29 @@ class Database:
         ORDER BY r.score DESC, r.recommended_at DESC
         LIMIT ?
         """
-        self.connect()
         result = self.fetch_all(query, (customer_id, limit))
-        recommendations = []
-        
-        if result:
-            columns = ["product_id", "category", "subcategory", "price", "brand", "product_rating", "score"]
-            for row in result:
-                rec_dict = {}
-                for i, col in enumerate(columns):
-                    # Safely handle potentially binary data
-                    if isinstance(row[i], bytes):
-                        try:
-                            rec_dict[col] = row[i].decode('utf-8')
-                        except UnicodeDecodeError:
-                            rec_dict[col] = "[Binary data]"
-                    else:
-                        rec_dict[col] = row[i]
-                recommendations.append(rec_dict)
-        
-        return recommendations
+        columns = ["product_id", "category", "subcategory", "price", "brand", "product_rating", "score"]
+        return [dict(zip(columns, row)) for row in result]
     
     def get_similar_customers(self, customer_id, limit=5):
         """Get similar customers based on demographics and behavior."""
-        # First, get the target customer's data
-        target = self.get_customer(customer_id)
-        
-        if not target:
-            return []
-        
-        # Find similar customers based on segment, age range, and location
+        # Match on segment, location and age range against the target customer in one query
         query = """
-        SELECT customer_id, age, gender, location, customer_segment, avg_order_value
-        FROM customers
-        WHERE customer_id != ? AND 
-              customer_segment = ? AND 
-              location = ? AND 
-              ABS(age - ?) <= 5
-        ORDER BY avg_order_value DESC
+        SELECT c2.customer_id, c2.age, c2.gender, c2.location, c2.customer_segment, c2.avg_order_value
+        FROM customers c1
+        JOIN customers c2
+          ON c2.customer_segment = c1.customer_segment AND
+             c2.location = c1.location AND
+             c2.age BETWEEN c1.age - 5 AND c1.age + 5 AND
+             c2.customer_id != c1.customer_id
+        WHERE c1.customer_id = ?
+        ORDER BY c2.avg_order_value DESC
         LIMIT ?
         """
         
-        params = (
-            customer_id,
-            target['customer_segment'],
-            target['location'],
-            target['age'],
-            limit
-        )
-        
-        self.connect()
-        result = self.fetch_all(query, params)
-        similar_customers = []
-        
-        if result:
-            columns = ["customer_id", "age", "gender", "location", "customer_segment", "avg_order_value"]
-            for row in result:
-                customer_dict = {}
-                for i, col in enumerate(columns):
-                    # Safely handle potentially binary data
-                    if isinstance(row[i], bytes):
-                        try:
-                            # First try UTF-8
-                            customer_dict[col] = row[i].decode('utf-8')
-                        except UnicodeDecodeError:
-                            try:
-                                # Try with 'latin-1' which can decode any byte value
-                                customer_dict[col] = row[i].decode('latin-1')
-                            except Exception:
-                                try:
-                                    # Try with 'ascii' and ignore errors
-                                    customer_dict[col] = row[i].decode('ascii', errors='ignore')
-                                except Exception:
-                                    # Last resort: represent as hex
-                                    customer_dict[col] = f"[Binary: {row[i].hex()[:10]}...]"
-                    else:
-                        customer_dict[col] = row[i]
-                similar_customers.append(customer_dict)
-        
-        return similar_customers
+        result = self.fetch_all(query, (customer_id, limit))
+        columns = ["customer_id", "age", "gender", "location", "customer_segment", "avg_order_value"]
+        return [dict(zip(columns, row)) for row in result]
 
 
 # Initialize the database
@@ -0,0 +1,18 @@
+"""
+Helpers for turning database query results into Python structures
+"""
+
+def fetch_dicts(db, query, columns, params=None):
+    """Run a query and return its rows as dicts keyed by column name.
+    
+    Args:
+        db: Database to query
+        query: SQL query whose result columns match columns
+        columns: Column names in result order
+        params: Optional query parameters
+        
+    Returns:
+        List of row dicts
+    """
+    # Text values are decoded by the connection's text_factory before they reach Python
+    return [dict(zip(columns, row)) for row in db.fetch_all(query, params) or ()]
@@ -3,20 +3,36 @@ LLM utility module for interacting with Ollama
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import hashlib
+import sqlite3
 import numpy as np
 import sys
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Add the parent directory to the system path to import from config
 sys.path.append(str(Path(__file__).parent.parent.parent))
-from smartshop.config import OLLAMA_BASE_URL, OLLAMA_LLM_MODEL, EMBEDDING_DIMENSION
+from smartshop.config import OLLAMA_BASE_URL, OLLAMA_LLM_MODEL, EMBEDDING_DIMENSION, EMBEDDING_CACHE_SIZE
+
+# Base URLs whose Ollama server has already been checked in this process
+_validated = set()
+
+class _EmbeddingUnavailable(Exception):
+    """Raised when Ollama returns no embedding, so the failure is not cached."""
+
+class OllamaResponseError(ValueError):
+    """Raised when a streamed Ollama response reports an error."""
 
 class OllamaClient:
     """Client for interacting with Ollama LLM API."""
     
-    def __init__(self, base_url=OLLAMA_BASE_URL, model=OLLAMA_LLM_MODEL, max_retries=3, retry_delay=2):
+    def __init__(self, base_url=OLLAMA_BASE_URL, model=OLLAMA_LLM_MODEL, max_retries=3, retry_delay=2,
+                 cache_db=None):
         """Initialize the Ollama client.
         
         Args:
@@ -24,6 +40,7 @@ class OllamaClient:
             model: Model name to use
             max_retries: Maximum number of retry attempts
             retry_delay: Delay in seconds between retries
+            cache_db: Optional Database whose embedding_cache table persists embeddings
         """
         self.base_url = base_url
         self.model = model
@@ -34,18 +51,34 @@ class OllamaClient:
         self.chat_endpoint = f"{base_url}/api/chat"
         self.list_endpoint = f"{base_url}/api/tags"
         
+        # Reuse keep-alive connections across calls; retries are handled by _execute_with_retry
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=32, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Connection": "keep-alive"})
+        
+        # Embedding cache: in-memory LRU keyed by text hash, in front of the embedding_cache table
+        self.cache_db = cache_db
+        self._embedding_lru = OrderedDict()
+        self._embedding_lru_lock = threading.Lock()
+        
         # Validate connection and model availability
         self._validate_connection()
     
     def _validate_connection(self):
-        """Validate connection to Ollama and verify model availability."""
+        """Validate connection to Ollama and verify model availability (once per base URL)."""
+        if self.base_url in _validated:
+            return
+        _validated.add(self.base_url)
+        
         try:
             # Check connection to Ollama server
-            response = requests.get(self.base_url)
+            response = self.session.get(self.base_url)
             response.raise_for_status()
             
             # Check if the model is available
-            list_response = requests.get(self.list_endpoint)
+            list_response = self.session.get(self.list_endpoint)
             list_response.raise_for_status()
             models = list_response.json().get("models", [])
             available_models = [model.get("name") for model in models]
@@ -88,12 +121,57 @@ class OllamaClient:
                     print(f"Request failed after {self.max_retries} attempts: {e}")
                     return None
     
-    def generate(self, prompt, system_prompt=None, max_tokens=1024, temperature=0.7):
-        """Generate text from a prompt."""
+    def _stream_with_retry(self, endpoint, payload, extract):
+        """Stream NDJSON chunks from an Ollama endpoint, yielding text as it arrives.
+        
+        Args:
+            endpoint: API endpoint to post to
+            payload: Request payload (sent with "stream": True)
+            extract: Function returning the text piece of a decoded chunk
+            
+        Yields:
+            Text pieces of the response
+            
+        Raises:
+            requests.exceptions.RequestException: If the request still fails after all retries
+            OllamaResponseError: If Ollama reports an error in the stream
+            ValueError: If a streamed line is not valid JSON
+        """
+        retries = 0
+        while True:
+            started = False
+            try:
+                with self.session.post(endpoint, json=payload, stream=True) as response:
+                    response.raise_for_status()
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if "error" in chunk:
+                            print(f"Ollama returned an error: {chunk['error']}")
+                            raise OllamaResponseError(chunk["error"])
+                        piece = extract(chunk)
+                        if piece:
+                            started = True
+                            yield piece
+                        if chunk.get("done"):
+                            break
+                return
+            except requests.exceptions.RequestException as e:
+                retries += 1
+                # Only retry when nothing has been yielded yet
+                if started or retries >= self.max_retries:
+                    print(f"Request failed after {retries} attempts: {e}")
+                    raise
+                print(f"Request failed: {e}. Retrying in {self.retry_delay} seconds... (Attempt {retries}/{self.max_retries})")
+                time.sleep(self.retry_delay)
+    
+    def generate_stream(self, prompt, system_prompt=None, max_tokens=1024, temperature=0.7):
+        """Generate text from a prompt, yielding tokens as Ollama produces them."""
         payload = {
             "model": self.model,
             "prompt": prompt,
-            "stream": False,
+            "stream": True,
             "max_tokens": max_tokens,
             "temperature": temperature
         }
@@ -101,70 +179,138 @@ class OllamaClient:
         if system_prompt:
             payload["system"] = system_prompt
         
-        def request_func():
-            response = requests.post(self.generate_endpoint, json=payload)
-            response.raise_for_status()
-            result = response.json()
-            return result.get("response", "")
-        
-        result = self._execute_with_retry(request_func)
-        return result if result is not None else "[Error: Could not generate response. Make sure Ollama is running with the correct model.]"
+        return self._stream_with_retry(
+            self.generate_endpoint, payload, lambda chunk: chunk.get("response", "")
+        )
     
-    def get_embedding(self, text):
-        """Get embedding vector for a text."""
+    def generate(self, prompt, system_prompt=None, max_tokens=1024, temperature=0.7):
+        """Generate text from a prompt."""
+        try:
+            return "".join(self.generate_stream(prompt, system_prompt, max_tokens, temperature))
+        except OllamaResponseError as e:
+            return f"[Error: Ollama could not generate a response: {e}]"
+        except (requests.exceptions.RequestException, ValueError):
+            return "[Error: Could not generate response. Make sure Ollama is running with the correct model.]"
+    
+    def _embedding_key(self, text):
+        """Hash the model name and text into a compact embedding cache key."""
+        return hashlib.blake2b(f"{self.model}\0{text}".encode(), digest_size=16).digest()
+    
+    def _load_embedding(self, key, text):
+        """Load an embedding from the persistent cache, requesting it from Ollama on a miss."""
+        if self.cache_db is not None:
+            try:
+                cached = self.cache_db.get_cached_embedding(key)
+            except sqlite3.Error:
+                cached = None
+            
+            if cached is not None:
+                return cached
+        
         payload = {
             "model": self.model,
             "prompt": text
         }
         
         def request_func():
-            response = requests.post(self.embeddings_endpoint, json=payload)
+            response = self.session.post(self.embeddings_endpoint, json=payload)
             response.raise_for_status()
             result = response.json()
-            return result.get("embedding", [0] * EMBEDDING_DIMENSION)
+            return result.get("embedding")
         
         result = self._execute_with_retry(request_func)
-        return result if result is not None else [0] * EMBEDDING_DIMENSION
+        if not result:
+            raise _EmbeddingUnavailable()
+        
+        embedding = np.asarray(result, dtype=np.float32)
+        if self.cache_db is not None:
+            try:
+                self.cache_db.store_cached_embedding(key, embedding)
+            except sqlite3.Error as e:
+                print(f"Warning: Could not cache embedding: {e}")
+        
+        # Cached arrays are shared between callers
+        embedding.flags.writeable = False
+        return embedding
     
-    def chat(self, messages, system_prompt=None, temperature=0.7):
-        """Chat with the LLM using a message format."""
+    def get_embedding(self, text):
+        """Get embedding vector for a text as a float32 numpy array (read-only, may be cached)."""
+        key = self._embedding_key(text)
+        with self._embedding_lru_lock:
+            embedding = self._embedding_lru.get(key)
+            if embedding is not None:
+                self._embedding_lru.move_to_end(key)
+                return embedding
+        
+        try:
+            embedding = self._load_embedding(key, text)
+        except _EmbeddingUnavailable:
+            return np.zeros(EMBEDDING_DIMENSION, dtype=np.float32)
+        
+        with self._embedding_lru_lock:
+            self._embedding_lru[key] = embedding
+            if len(self._embedding_lru) > EMBEDDING_CACHE_SIZE:
+                self._embedding_lru.popitem(last=False)
+        return embedding
+    
+    def get_embeddings_batch(self, texts, max_workers=8):
+        """Get embeddings for several texts with concurrent requests.
+        
+        Args:
+            texts: List of texts to embed
+            max_workers: Maximum number of concurrent requests to Ollama
+            
+        Returns:
+            Float32 numpy matrix of shape (len(texts), D)
+        """
+        if not texts:
+            return np.empty((0, EMBEDDING_DIMENSION), dtype=np.float32)
+        
+        # Workers share the session's keep-alive connection pool
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(texts))) as executor:
+            embeddings = list(executor.map(self.get_embedding, texts))
+        
+        return np.stack(embeddings)
+    
+    def chat_stream(self, messages, system_prompt=None, temperature=0.7):
+        """Chat with the LLM, yielding the reply as Ollama produces it."""
         payload = {
             "model": self.model,
             "messages": messages,
-            "stream": False,
+            "stream": True,
             "temperature": temperature
         }
         
         if system_prompt:
             payload["system"] = system_prompt
         
-        def request_func():
-            response = requests.post(self.chat_endpoint, json=payload)
-            response.raise_for_status()
-            result = response.json()
-            return result.get("message", {}).get("content", "")
-        
-        result = self._execute_with_retry(request_func)
-        return result if result is not None else "[Error: Could not generate chat response. Make sure Ollama is running with the correct model.]"
+        return self._stream_with_retry(
+            self.chat_endpoint, payload, lambda chunk: chunk.get("message", {}).get("content", "")
+        )
+    
+    def chat(self, messages, system_prompt=None, temperature=0.7):
+        """Chat with the LLM using a message format."""
+        try:
+            return "".join(self.chat_stream(messages, system_prompt, temperature))
+        except OllamaResponseError as e:
+            return f"[Error: Ollama could not generate a chat response: {e}]"
+        except (requests.exceptions.RequestException, ValueError):
+            return "[Error: Could not generate chat response. Make sure Ollama is running with the correct model.]"
     
     def similarity(self, embedding1, embedding2):
         """Calculate cosine similarity between two embeddings."""
-        if not embedding1 or not embedding2:
-            return 0.0
+        vec1 = np.asarray(embedding1, dtype=np.float32)
+        vec2 = np.asarray(embedding2, dtype=np.float32)
         
-        # Convert to numpy arrays
-        vec1 = np.array(embedding1)
-        vec2 = np.array(embedding2)
+        if vec1.size == 0 or vec2.size == 0:
+            return 0.0
         
         # Compute cosine similarity
-        dot_product = np.dot(vec1, vec2)
-        norm1 = np.linalg.norm(vec1)
-        norm2 = np.linalg.norm(vec2)
-        
-        if norm1 == 0 or norm2 == 0:
+        norms = np.linalg.norm(vec1) * np.linalg.norm(vec2)
+        if norms == 0:
             return 0.0
         
-        return dot_product / (norm1 * norm2)
+        return float(vec1 @ vec2 / norms)
 
 
 # Test the Ollama client when run directly
@@ -4,38 +4,120 @@ Web UI for SmartShop E-commerce Personalized Recommendation System
 
 import os
 import sys
+import io
+import csv
 import json
+import time
+import sqlite3
+import threading
+import zlib
+from functools import lru_cache
 from pathlib import Path
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session, g
-import pandas as pd
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, flash, session, g, stream_with_context, abort
+from flask.json.provider import DefaultJSONProvider
 import re
+from markupsafe import Markup, escape
 
 # Add the parent directory to the system path
 sys.path.append(str(Path(__file__).parent.parent))
-from smartshop.agents.coordination_agent import CoordinationAgent
 from smartshop.utils.database import Database, init_db
+from smartshop.utils.db_rows import fetch_dicts
+from smartshop.tasks import submit_job, get_job
 from smartshop.config import AGENTS, OLLAMA_BASE_URL, OLLAMA_LLM_MODEL
 from smartshop.check_ollama import check_ollama_running, is_model_available
 
+# Use orjson for JSON responses when it is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that encodes with orjson, falling back to the stdlib provider without it."""
+    
+    def _orjson_dumps(self, obj):
+        # Match DefaultJSONProvider: sorted keys, and dates passed through to self.default
+        # so they keep Flask's HTTP date format; numpy values are encoded natively
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option)
+    
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._orjson_dumps(obj).decode()
+    
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        # orjson emits bytes, so the body skips the str round trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._orjson_dumps(obj), mimetype=self.mimetype)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.secret_key = os.environ.get('SECRET_KEY', 'smartshop-secret-key-for-development')
 
 # Add custom filters for templates
+_NEWLINE_RE = re.compile(r'\r\n|\r|\n')
+
 @app.template_filter('nl2br')
 def nl2br(value):
-    """Convert newlines to <br> tags for display in HTML."""
-    if value:
-        return value.replace('\n', '<br>')
-    return value
+    """Convert newlines to <br> tags for display in HTML, escaping the text unless it is already Markup."""
+    if not value:
+        return value
+    return Markup(_NEWLINE_RE.sub('<br>\n', str(escape(value))))
+
+_HEADING_RE = re.compile(r'^(#{1,2}) (.*)$', re.MULTILINE)
+_BOLD_RE = re.compile(r'\*\*(.+?)\*\*')
+
+def _heading(match):
+    tag = 'h5' if len(match.group(1)) == 1 else 'h6'
+    return f'<{tag}>{match.group(2)}</{tag}>'
+
+def render_llm_text(value):
+    """Render LLM text as escaped HTML with its headings, bold text and line breaks.
+    
+    Args:
+        value: Text returned by an agent
+    
+    Returns:
+        Markup ready to be written into a template as-is
+    """
+    if not value:
+        return Markup('')
+    html = _HEADING_RE.sub(_heading, str(escape(value)))
+    html = _BOLD_RE.sub(r'<strong>\1</strong>', html)
+    return Markup(_NEWLINE_RE.sub('<br>\n', html))
+
+# Ollama health is polled by a background thread; views read _HEALTH without any I/O
+HEALTH_CHECK_INTERVAL = float(os.environ.get('SMARTSHOP_HEALTH_INTERVAL', 5))
+HEALTH_CHECK_TIMEOUT = 2
+_HEALTH = {"running": False, "model_available": False, "checked_at": 0.0}
+
+def check_ollama_health():
+    """Probe Ollama and publish the result in _HEALTH."""
+    global _HEALTH
+    running = check_ollama_running(timeout=HEALTH_CHECK_TIMEOUT)
+    model_available = running and is_model_available(OLLAMA_LLM_MODEL, timeout=HEALTH_CHECK_TIMEOUT)
+    # Replace the dict rather than mutating it so readers always see a consistent snapshot
+    _HEALTH = {"running": running, "model_available": model_available, "checked_at": time.time()}
+    return _HEALTH
+
+def _health_loop():
+    """Re-check Ollama health every HEALTH_CHECK_INTERVAL seconds."""
+    while True:
+        time.sleep(HEALTH_CHECK_INTERVAL)
+        try:
+            check_ollama_health()
+        except Exception as e:
+            app.logger.error(f"Error checking Ollama health: {str(e)}")
 
 # Check Ollama status at startup
-OLLAMA_STATUS = {
-    "running": check_ollama_running(),
-    "model_available": False
-}
+OLLAMA_STATUS = check_ollama_health()
 
 if OLLAMA_STATUS["running"]:
-    OLLAMA_STATUS["model_available"] = is_model_available(OLLAMA_LLM_MODEL)
     if not OLLAMA_STATUS["model_available"]:
         app.logger.warning(f"Ollama is running but model '{OLLAMA_LLM_MODEL}' is not available.")
         app.logger.warning(f"Please run: python -m smartshop.check_ollama")
@@ -44,73 +126,286 @@ else:
     app.logger.warning("Please start Ollama with 'ollama serve' before using SmartShop.")
     app.logger.warning("Then run: python -m smartshop.check_ollama")
 
+threading.Thread(target=_health_loop, name="ollama-health", daemon=True).start()
+
+# Shared across requests; each request thread borrows a pooled connection
+# on first query and hands it back in close_resources()
+DB_POOL = Database(max_idle=int(os.environ.get('SMARTSHOP_DB_POOL_SIZE', 5)))
+
+# Queries used by the views; kept as constants so each request reuses the same
+# SQL text and hits the connection's compiled-statement cache
+SQL_COUNT_CUSTOMERS_PRODUCTS = "SELECT (SELECT COUNT(*) FROM customers), (SELECT COUNT(*) FROM products)"
+SQL_LIST_CATEGORIES = "SELECT DISTINCT category FROM products ORDER BY category"
+SQL_LIST_CUSTOMERS = """
+SELECT customer_id, age, gender, location, customer_segment, avg_order_value
+FROM customers
+ORDER BY customer_id
+"""
+CUSTOMER_LIST_COLUMNS = ["customer_id", "age", "gender", "location", "customer_segment", "avg_order_value"]
+SQL_LIST_PRODUCTS = """
+SELECT product_id, category, subcategory, price, brand, product_rating
+FROM products
+ORDER BY category, subcategory
+"""
+PRODUCT_LIST_COLUMNS = ["product_id", "category", "subcategory", "price", "brand", "product_rating"]
+SQL_API_CUSTOMERS = "SELECT customer_id, age, gender, location FROM customers"
+API_CUSTOMER_COLUMNS = ["customer_id", "age", "gender", "location"]
+SQL_API_PRODUCTS = "SELECT product_id, category, subcategory, price FROM products"
+API_PRODUCT_COLUMNS = ["product_id", "category", "subcategory", "price"]
+SQL_EXPORT_PRODUCTS = """
+SELECT product_id, category, subcategory, price, brand, product_rating
+FROM products
+{where}
+ORDER BY category, subcategory, product_id
+LIMIT ? OFFSET ?
+"""
+# Query parameters export_products accepts as equality filters, mapped to their columns
+EXPORT_PRODUCT_FILTERS = {"category": "category", "subcategory": "subcategory", "brand": "brand"}
+SQL_DEBUG_CUSTOMERS = "SELECT customer_id, age, gender, location FROM customers LIMIT 20"
+DEBUG_CUSTOMER_COLUMNS = ["customer_id", "age", "gender", "location"]
+
 def get_db():
-    """Get a database connection for the current request."""
+    """Get the database for the current request."""
     if 'db' not in g:
-        g.db = Database()
+        g.db = DB_POOL
     return g.db
 
+def stream_json_array(columns, batches):
+    """Yield a JSON array of row objects, one chunk per batch of rows."""
+    # Bind the per-row callables to locals so the row loop avoids global and builtin lookups
+    dumps, make_dict, pair = app.json.dumps, dict, zip
+    separator = '['
+    for batch in batches:
+        # Encode each batch with a single call and drop its brackets so the batches join into one array
+        yield separator + dumps([make_dict(pair(columns, row)) for row in batch])[1:-1]
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+def stream_csv(columns, batches):
+    """Yield CSV text with a header row, one chunk per batch of rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    # Send the header right away so the download starts before the first batch is ready
+    yield buffer.getvalue()
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate(0)
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+# One CoordinationAgent serves every request and job; it keeps no per-request state and its
+# sub-agents share pooled Ollama sessions and per-thread database connections
+_AGENT = None
+_AGENT_LOCK = threading.Lock()
+
 def get_agent():
     """Get or initialize the coordination agent singleton."""
-    if 'agent' not in g:
-        g.agent = CoordinationAgent()
-    return g.agent
+    global _AGENT
+    if _AGENT is None:
+        with _AGENT_LOCK:
+            if _AGENT is None:
+                # Import here so the agents load only when first needed
+                from smartshop.agents.coordination_agent import CoordinationAgent
+                _AGENT = CoordinationAgent()
+    return _AGENT
+
+# get_system_status() probes Ollama and the database; reuse its result for a few seconds
+STATUS_CACHE_TTL = float(os.environ.get('SMARTSHOP_STATUS_CACHE_TTL', 5))
+_STATUS_CACHE = {"value": None, "ts": 0.0}
+
+def invalidate_status_cache():
+    """Force the next get_system_status() call to recompute the status."""
+    _STATUS_CACHE["value"] = None
+
+# Bumped whenever initialize/load_data change the data, so derived caches are rebuilt
+_DATA_VERSION = 0
+_CATEGORY_CACHE = {"v": None, "data": None}
+
+def bump_data_version():
+    """Mark data-derived caches as stale after the data has changed."""
+    global _DATA_VERSION
+    _DATA_VERSION += 1
+
+def get_categories():
+    """Get the distinct product categories, cached until the data version changes."""
+    if _CATEGORY_CACHE["v"] == _DATA_VERSION:
+        return _CATEGORY_CACHE["data"]
+    
+    version = _DATA_VERSION
+    categories = [row[0] for row in get_db().fetch_all(SQL_LIST_CATEGORIES)]
+    _CATEGORY_CACHE["data"] = categories
+    _CATEGORY_CACHE["v"] = version
+    return categories
+
+# Finished analyses are reused for identical inputs until the data changes
+ANALYSIS_CACHE_SIZE = 512
+# How long browsers may reuse a finished analysis page (seconds)
+ANALYSIS_MAX_AGE = int(os.environ.get('SMARTSHOP_ANALYSIS_MAX_AGE', 60))
+# Prefix of the messages OllamaClient returns when an LLM call fails; results containing them are not cached
+LLM_ERROR_PREFIX = "[Error:"
+# How often the progress page of a running analysis reloads itself (seconds)
+JOB_REFRESH_SECONDS = 2
+
+# LLM text fields of each analysis that are rendered to HTML once, stored alongside as <field>_html
+RENDERED_FIELDS = {
+    'get_personalized_recommendations': ('personalized_shopping_guide', 'customer_interests'),
+    'get_customer_profile_analysis': ('summary', 'browsing_analysis', 'purchase_analysis'),
+    'get_product_analysis': ('report', 'similar_products.analysis', 'complementary_products.analysis', 'category_insights'),
+    'get_category_trend_analysis': ('insights', 'trend_analysis'),
+    'get_seasonal_recommendations': ('seasonal_shopping_guide',)
+}
+
+def prerender_result(method_name, result):
+    """Add pre-rendered <field>_html Markup for an analysis result's LLM text fields.
+    
+    Args:
+        method_name: Name of the CoordinationAgent method that produced the result
+        result: The analysis result
+    
+    Returns:
+        A copy of the result with the rendered fields added
+    """
+    if not isinstance(result, dict):
+        return result
+    
+    result = dict(result)
+    for path in RENDERED_FIELDS.get(method_name, ()):
+        *parents, field = path.split('.')
+        target = result
+        for parent in parents:
+            if not isinstance(target.get(parent), dict):
+                break
+            # Copy nested dicts so the agent's own objects are left untouched
+            target[parent] = dict(target[parent])
+            target = target[parent]
+        else:
+            if field in target:
+                target[f'{field}_html'] = render_llm_text(target[field])
+    return result
+
+class _DegradedResult(Exception):
+    """Raised with an analysis result that contains errors, so lru_cache does not keep it."""
+    
+    def __init__(self, result):
+        super().__init__()
+        self.result = result
+
+def _is_degraded(value):
+    """Check whether an analysis result contains an LLM error message or an error entry."""
+    if isinstance(value, str):
+        return value.startswith(LLM_ERROR_PREFIX)
+    if isinstance(value, dict):
+        return 'error' in value or any(_is_degraded(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(_is_degraded(item) for item in value)
+    return False
+
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def _cached_analysis(method_name, args, data_version, llm_available):
+    """Run a CoordinationAgent analysis; data_version and llm_available only key the cache."""
+    # Dict arguments arrive frozen as sorted item tuples
+    args = [dict(arg) if isinstance(arg, tuple) else arg for arg in args]
+    result = prerender_result(method_name, getattr(get_agent(), method_name)(*args))
+    if _is_degraded(result):
+        raise _DegradedResult(result)
+    return result
+
+def run_analysis(method_name, *args):
+    """Run a CoordinationAgent analysis, reusing an earlier result for the same inputs.
+    
+    Args:
+        method_name: Name of the CoordinationAgent method to call
+        *args: Arguments for the method; dicts are frozen so they can key the cache
+    
+    Returns:
+        The analysis result (shared between callers, so treat it as read-only)
+    """
+    frozen = tuple(tuple(sorted(arg.items())) if isinstance(arg, dict) else arg for arg in args)
+    # Keying on LLM availability keeps results produced while Ollama was down from being replayed later
+    try:
+        return _cached_analysis(method_name, frozen, _DATA_VERSION, _HEALTH["model_available"])
+    except _DegradedResult as e:
+        # A failed LLM call is returned once but never cached
+        return e.result
 
 def get_system_status():
-    """Get the current system status."""
-    db = get_db()
-    database_exists = db.check_connection()
+    """Get the current system status, cached for STATUS_CACHE_TTL seconds."""
+    cached = _STATUS_CACHE["value"]
+    if cached is not None and time.monotonic() - _STATUS_CACHE["ts"] < STATUS_CACHE_TTL:
+        return dict(cached)
     
-    # Check Ollama status again (in case it was started after app initialization)
-    ollama_running = check_ollama_running()
-    model_available = False
-    if ollama_running:
-        model_available = is_model_available(OLLAMA_LLM_MODEL)
+    system_status = _compute_system_status()
+    _STATUS_CACHE["value"] = system_status
+    _STATUS_CACHE["ts"] = time.monotonic()
+    return dict(system_status)
+
+def _probe_database(db):
+    """Check the database file and count customers and products.
     
-    # Default values
-    system_status = {
+    Returns:
+        Dictionary of database-related status fields
+    """
+    database_exists = db.check_connection()
+    db_status = {
         "database_exists": database_exists,
-        "config_loaded": True,  # Assume config is always loaded
-        "agents_ready": ollama_running and model_available,  # Agents need Ollama with the correct model
         "has_data": False,
         "customer_count": 0,
-        "product_count": 0,
-        "is_ready": database_exists and ollama_running and model_available,
-        "ollama_running": ollama_running,
-        "model_available": model_available
+        "product_count": 0
     }
     
     # If database exists, try to get counts
     if database_exists:
         try:
-            # First check if tables exist
-            tables_exist = db.table_exists("customers") and db.table_exists("products")
-            system_status["tables_exist"] = tables_exist
+            # Read the trigger-maintained row counts, falling back to counting
+            # for databases created before the counters table existed
+            try:
+                counts = db.get_row_counts()
+                customer_count, product_count = int(counts['customers']), int(counts['products'])
+            except (sqlite3.OperationalError, KeyError):
+                # Count both tables in one round-trip; a missing table raises OperationalError
+                count_result = db.fetch_one(SQL_COUNT_CUSTOMERS_PRODUCTS)
+                customer_count, product_count = int(count_result[0]), int(count_result[1])
+            db_status["tables_exist"] = True
             
-            if tables_exist:
-                # Use direct database queries instead of pandas
-                db.connect()
-                
-                customer_query = "SELECT COUNT(*) as count FROM customers"
-                customer_result = db.fetch_one(customer_query)
-                
-                product_query = "SELECT COUNT(*) as count FROM products"
-                product_result = db.fetch_one(product_query)
-                
-                if customer_result and product_result:
-                    customer_count = customer_result[0]
-                    product_count = product_result[0]
-                    
-                    system_status["customer_count"] = int(customer_count)
-                    system_status["product_count"] = int(product_count)
-                    system_status["has_data"] = (int(customer_count) > 0 or int(product_count) > 0)
-                    
-                    # Add debug info
-                    app.logger.info(f"get_system_status: customer_count={customer_count}, product_count={product_count}, has_data={system_status['has_data']}")
-        except Exception as e:
+            db_status["customer_count"] = customer_count
+            db_status["product_count"] = product_count
+            db_status["has_data"] = (customer_count > 0 or product_count > 0)
+            
+            # Add debug info
+            app.logger.info(f"get_system_status: customer_count={customer_count}, product_count={product_count}, has_data={db_status['has_data']}")
+        except sqlite3.OperationalError as e:
             # Tables might not exist yet
+            db_status["tables_exist"] = False
+            app.logger.info(f"get_system_status: tables not ready: {str(e)}")
+        except Exception as e:
             app.logger.error(f"Error in get_system_status: {str(e)}")
-            system_status["error"] = str(e)
+            db_status["error"] = str(e)
+    
+    return db_status
+
+def _compute_system_status():
+    """Compute the current system status."""
+    # Ollama status comes from the background health check (so a later 'ollama serve' is picked up)
+    health = _HEALTH
+    ollama_running, model_available = health["running"], health["model_available"]
+    db_status = _probe_database(get_db())
+    
+    database_exists = db_status["database_exists"]
+    system_status = {
+        "database_exists": database_exists,
+        "config_loaded": True,  # Assume config is always loaded
+        "agents_ready": ollama_running and model_available,  # Agents need Ollama with the correct model
+        "has_data": db_status["has_data"],
+        "customer_count": db_status["customer_count"],
+        "product_count": db_status["product_count"],
+        "is_ready": database_exists and ollama_running and model_available,
+        "ollama_running": ollama_running,
+        "model_available": model_available
+    }
+    for key in ("tables_exist", "error"):
+        if key in db_status:
+            system_status[key] = db_status[key]
     
     return system_status
 
@@ -143,6 +438,8 @@ def initialize():
             
             # Use a new database connection for initialization
             init_db()
+            invalidate_status_cache()
+            bump_data_version()
             flash('System initialized successfully!', 'success')
         except Exception as e:
             flash(f'Error initializing system: {e}', 'error')
@@ -174,11 +471,15 @@ def load_data():
                 # Import here to avoid circular imports
                 from smartshop.data_loader import create_sample_data
                 create_sample_data()
+                invalidate_status_cache()
+                bump_data_version()
                 flash('Sample data loaded successfully!', 'success')
             else:
                 # Import here to avoid circular imports
                 from smartshop.data_loader import load_all_data
                 load_all_data()
+                invalidate_status_cache()
+                bump_data_version()
                 flash('Data loaded from CSV files successfully!', 'success')
         except Exception as e:
             flash(f'Error loading data: {e}', 'error')
@@ -191,42 +492,10 @@ def load_data():
 def list_customers():
     """List all customers in the database."""
     try:
-        query = """
-        SELECT customer_id, age, gender, location, customer_segment, avg_order_value
-        FROM customers
-        ORDER BY customer_id
-        """
-        # Connect directly to the database to avoid pandas encoding issues
+        query = SQL_LIST_CUSTOMERS
         db = get_db()
-        db.connect()
-        customers = []
-        
-        result = db.fetch_all(query)
-        if result:
-            # Manually convert to dictionaries to avoid encoding issues
-            columns = ["customer_id", "age", "gender", "location", "customer_segment", "avg_order_value"]
-            for row in result:
-                customer_dict = {}
-                for i, col in enumerate(columns):
-                    # Safely handle potentially binary data
-                    if isinstance(row[i], bytes):
-                        try:
-                            # First try UTF-8
-                            customer_dict[col] = row[i].decode('utf-8')
-                        except UnicodeDecodeError:
-                            try:
-                                # Try with 'latin-1' which can decode any byte value
-                                customer_dict[col] = row[i].decode('latin-1')
-                            except Exception:
-                                try:
-                                    # Try with 'ascii' and ignore errors
-                                    customer_dict[col] = row[i].decode('ascii', errors='ignore')
-                                except Exception:
-                                    # Last resort: represent as hex
-                                    customer_dict[col] = f"[Binary: {row[i].hex()[:10]}...]"
-                    else:
-                        customer_dict[col] = row[i]
-                customers.append(customer_dict)
+        columns = CUSTOMER_LIST_COLUMNS
+        customers = fetch_dicts(db, query, columns)
         
         return render_template('customers.html', customers=customers)
     except Exception as e:
@@ -237,42 +506,10 @@ def list_customers():
 def list_products():
     """List all products in the database."""
     try:
-        query = """
-        SELECT product_id, category, subcategory, price, brand, product_rating
-        FROM products
-        ORDER BY category, subcategory
-        """
-        # Connect directly to the database to avoid pandas encoding issues
+        query = SQL_LIST_PRODUCTS
         db = get_db()
-        db.connect()
-        products = []
-        
-        result = db.fetch_all(query)
-        if result:
-            # Manually convert to dictionaries to avoid encoding issues
-            columns = ["product_id", "category", "subcategory", "price", "brand", "product_rating"]
-            for row in result:
-                product_dict = {}
-                for i, col in enumerate(columns):
-                    # Safely handle potentially binary data
-                    if isinstance(row[i], bytes):
-                        try:
-                            # First try UTF-8
-                            product_dict[col] = row[i].decode('utf-8')
-                        except UnicodeDecodeError:
-                            try:
-                                # Try with 'latin-1' which can decode any byte value
-                                product_dict[col] = row[i].decode('latin-1')
-                            except Exception:
-                                try:
-                                    # Try with 'ascii' and ignore errors
-                                    product_dict[col] = row[i].decode('ascii', errors='ignore')
-                                except Exception:
-                                    # Last resort: represent as hex
-                                    product_dict[col] = f"[Binary: {row[i].hex()[:10]}...]"
-                    else:
-                        product_dict[col] = row[i]
-                products.append(product_dict)
+        columns = PRODUCT_LIST_COLUMNS
+        products = fetch_dicts(db, query, columns)
         
         return render_template('products.html', products=products)
     except Exception as e:
@@ -287,15 +524,14 @@ def recommendations():
         context_type = request.form.get('context_type', 'none')
         context_value = request.form.get('context_value', '')
         
-        agent = get_agent()
         context = {}
         
         if context_type != 'none' and context_value:
             context[context_type] = context_value
         
         try:
-            result = agent.get_personalized_recommendations(customer_id, context)
-            return render_template('recommendation_results.html', results=result)
+            job_id = submit_job('recommendations', run_analysis, 'get_personalized_recommendations', customer_id, context)
+            return redirect(url_for('job_status', job_id=job_id))
         except Exception as e:
             flash(f'Error generating recommendations: {e}', 'error')
             return redirect(url_for('recommendations'))
@@ -316,11 +552,10 @@ def customer_analysis():
     """Analyze a customer's profile and behavior."""
     if request.method == 'POST':
         customer_id = request.form.get('customer_id')
-        agent = get_agent()
         
         try:
-            result = agent.get_customer_profile_analysis(customer_id)
-            return render_template('customer_analysis_results.html', results=result)
+            job_id = submit_job('customer_analysis', run_analysis, 'get_customer_profile_analysis', customer_id)
+            return redirect(url_for('job_status', job_id=job_id))
         except Exception as e:
             flash(f'Error analyzing customer: {e}', 'error')
             return redirect(url_for('customer_analysis'))
@@ -341,15 +576,10 @@ def product_analysis():
     """Analyze a product, its context, and potential customers."""
     if request.method == 'POST':
         product_id = request.form.get('product_id')
-        agent = get_agent()
         
         try:
-            result = agent.get_product_analysis(product_id)
-            
-            # Make sure all text fields use |safe and |nl2br instead of |linebreaksbr
-            # No need to modify - templates already use |replace
-            
-            return render_template('product_analysis_results.html', results=result)
+            job_id = submit_job('product_analysis', run_analysis, 'get_product_analysis', product_id)
+            return redirect(url_for('job_status', job_id=job_id))
         except Exception as e:
             flash(f'Error analyzing product: {e}', 'error')
             return redirect(url_for('product_analysis'))
@@ -370,7 +600,6 @@ def category_analysis():
     """Analyze trends in a product category."""
     if request.method == 'POST':
         category = request.form.get('category')
-        agent = get_agent()
         
         # Validate category input
         if not category:
@@ -380,36 +609,8 @@ def category_analysis():
         app.logger.info(f"Processing category analysis for: {category}")
         
         try:
-            # Get data from the agent
-            result = agent.get_category_trend_analysis(category)
-            
-            # Debug information
-            app.logger.info(f"Category analysis result keys: {result.keys()}")
-            
-            # Use chart data generated by the agent, or provide defaults if missing
-            price_trend_data = result.get('price_trend_data', {
-                'labels': [],
-                'datasets': [{'label': 'Avg Price', 'data': []}]
-            })
-            
-            popularity_data = result.get('popularity_data', {
-                'labels': [],
-                'datasets': [{'label': 'Popularity Score', 'data': []}]
-            })
-            
-            # Check if we have actual data in the result
-            if 'message' in result or (not result.get('trending_products') and not result.get('insights')):
-                message = result.get('message', 'No data found for this category')
-                flash(f'{message}. Please try another category.', 'warning')
-                return redirect(url_for('category_analysis'))
-            
-            # Render the template with data
-            return render_template(
-                'category_analysis_results.html', 
-                results=result,
-                price_trend_data=price_trend_data,
-                popularity_data=popularity_data
-            )
+            job_id = submit_job('category_analysis', run_analysis, 'get_category_trend_analysis', category)
+            return redirect(url_for('job_status', job_id=job_id))
         except Exception as e:
             app.logger.error(f"Error in category analysis: {str(e)}", exc_info=True)
             flash(f'Error analyzing category: {e}', 'error')
@@ -427,19 +628,7 @@ def category_analysis():
     # Fetch categories directly to populate the dropdown
     categories = []
     try:
-        db = get_db()
-        db.connect()
-        query = "SELECT DISTINCT category FROM products ORDER BY category"
-        result = db.fetch_all(query)
-        if result:
-            for row in result:
-                if isinstance(row[0], bytes):
-                    try:
-                        categories.append(row[0].decode('utf-8'))
-                    except UnicodeDecodeError:
-                        categories.append("[Binary data]")
-                else:
-                    categories.append(row[0])
+        categories = get_categories()
     except Exception as e:
         app.logger.error(f"Error fetching categories: {str(e)}")
         flash('Error loading categories. Please check database connection.', 'error')
@@ -452,11 +641,10 @@ def seasonal_recommendations():
     if request.method == 'POST':
         customer_id = request.form.get('customer_id')
         season = request.form.get('season')
-        agent = get_agent()
         
         try:
-            result = agent.get_seasonal_recommendations(customer_id, season)
-            return render_template('seasonal_recommendations_results.html', results=result)
+            job_id = submit_job('seasonal_recommendations', run_analysis, 'get_seasonal_recommendations', customer_id, season)
+            return redirect(url_for('job_status', job_id=job_id))
         except Exception as e:
             flash(f'Error generating seasonal recommendations: {e}', 'error')
             return redirect(url_for('seasonal_recommendations'))
@@ -472,47 +660,136 @@ def seasonal_recommendations():
     
     return render_template('seasonal_recommendations.html', system_status=system_status)
 
+def _render_category_results(result):
+    """Render a finished category analysis, or send the user back if it found nothing."""
+    # Debug information
+    app.logger.info(f"Category analysis result keys: {result.keys()}")
+    
+    # Use chart data generated by the agent, or provide defaults if missing
+    price_trend_data = result.get('price_trend_data', {
+        'labels': [],
+        'datasets': [{'label': 'Avg Price', 'data': []}]
+    })
+    
+    popularity_data = result.get('popularity_data', {
+        'labels': [],
+        'datasets': [{'label': 'Popularity Score', 'data': []}]
+    })
+    
+    # Check if we have actual data in the result
+    if 'message' in result or (not result.get('trending_products') and not result.get('insights')):
+        message = result.get('message', 'No data found for this category')
+        flash(f'{message}. Please try another category.', 'warning')
+        return redirect(url_for('category_analysis'))
+    
+    # Render the template with data
+    return render_template(
+        'category_analysis_results.html', 
+        results=result,
+        price_trend_data=price_trend_data,
+        popularity_data=popularity_data
+    )
+
+# For each job kind: the form endpoint to return to, the error message prefix,
+# and how to render the finished result
+JOB_VIEWS = {
+    'recommendations': ('recommendations', 'Error generating recommendations',
+                        lambda result: render_template('recommendation_results.html', results=result)),
+    'customer_analysis': ('customer_analysis', 'Error analyzing customer',
+                          lambda result: render_template('customer_analysis_results.html', results=result)),
+    'product_analysis': ('product_analysis', 'Error analyzing product',
+                         lambda result: render_template('product_analysis_results.html', results=result)),
+    'category_analysis': ('category_analysis', 'Error analyzing category', _render_category_results),
+    'seasonal_recommendations': ('seasonal_recommendations', 'Error generating seasonal recommendations',
+                                 lambda result: render_template('seasonal_recommendations_results.html', results=result))
+}
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Show a background analysis job: a progress page while it runs, its results once finished."""
+    job = get_job(job_id)
+    if job is None:
+        flash('This analysis was not found or has expired. Please run it again.', 'warning')
+        return redirect(url_for('home'))
+    
+    form_endpoint, error_prefix, render_result = JOB_VIEWS[job['kind']]
+    
+    if job['state'] == 'failed':
+        app.logger.error(f"Job {job_id} ({job['kind']}) failed: {job['error']}")
+        flash(f"{error_prefix}: {job['error']}", 'error')
+        return redirect(url_for(form_endpoint))
+    
+    if job['state'] == 'finished':
+        try:
+            response = app.make_response(render_result(job['result']))
+            if response.status_code == 200 and not _is_degraded(job['result']):
+                # The result for this job never changes, so back/refresh can reuse it
+                response.headers['Cache-Control'] = f'private, max-age={ANALYSIS_MAX_AGE}'
+            return response
+        except Exception as e:
+            flash(f'{error_prefix}: {e}', 'error')
+            return redirect(url_for(form_endpoint))
+    
+    # Still running: poll by reloading the page
+    return render_template('job_status.html', job=job, refresh_seconds=JOB_REFRESH_SECONDS)
+
+@app.route('/api/job/<job_id>')
+def api_job_status(job_id):
+    """API endpoint to poll a background analysis job."""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    response = {"id": job['id'], "kind": job['kind'], "state": job['state']}
+    if job['state'] == 'finished':
+        response["result"] = job['result']
+    elif job['state'] == 'failed':
+        response["error"] = job['error']
+    return jsonify(response)
+
 @app.route('/debug/system-status')
 def debug_system_status():
     """Debug endpoint to display system status"""
     system_status = get_system_status()
+    db = get_db()
     # Pretty format for display
-    output = "<h1>System Status</h1>"
-    output += "<pre>"
-    for key, value in system_status.items():
-        output += f"{key}: {value}\n"
-    output += "</pre>"
-    output += "<h2>Database Connection</h2>"
-    output += f"<p>DB Path: {get_db().db_path}</p>"
+    parts = ["<h1>System Status</h1>", "<pre>"]
+    parts.extend(f"{key}: {value}\n" for key, value in system_status.items())
+    parts.append("</pre>")
+    parts.append("<h2>Database Connection</h2>")
+    parts.append(f"<p>DB Path: {db.db_path}</p>")
     try:
-        get_db().connect()
-        output += "<p style='color:green'>Connection successful</p>"
+        db.connect()
+        parts.append("<p style='color:green'>Connection successful</p>")
         
         # Check tables
         query = "SELECT name FROM sqlite_master WHERE type='table'"
-        tables = get_db().fetch_all(query)
+        tables = [row[0] for row in db.fetch_all(query)]
         if not tables:
-            output += "<p>No tables found</p>"
+            parts.append("<p>No tables found</p>")
         else:
-            output += "<h3>Tables:</h3><ul>"
-            for table_row in tables:
-                table = table_row[0]
-                output += f"<li>{table}</li>"
-                # Get count for each table
-                try:
-                    count_query = f"SELECT COUNT(*) as count FROM {table}"
-                    count_result = get_db().fetch_one(count_query)
-                    count = count_result[0] if count_result else 0
-                    output += f" - {count} records"
-                except:
-                    output += " - Error getting count"
-            output += "</ul>"
-        
-        get_db().close()
+            count_queries = [
+                'SELECT COUNT(*) FROM "{}"'.format(table.replace('"', '""')) for table in tables
+            ]
+            # Get the count for every table in a single query
+            try:
+                counts = [f" - {row[0]} records" for row in db.fetch_all(" UNION ALL ".join(count_queries))]
+            except Exception:
+                # One broken table fails the combined query; count tables one by one instead
+                counts = []
+                for count_query in count_queries:
+                    try:
+                        counts.append(f" - {db.fetch_one(count_query)[0]} records")
+                    except Exception:
+                        counts.append(" - Error getting count")
+            
+            parts.append("<h3>Tables:</h3><ul>")
+            parts.extend(f"<li>{table}</li>{count}" for table, count in zip(tables, counts))
+            parts.append("</ul>")
     except Exception as e:
-        output += f"<p style='color:red'>Connection error: {str(e)}</p>"
+        parts.append(f"<p style='color:red'>Connection error: {str(e)}</p>")
     
-    return output
+    return ''.join(parts)
 
 @app.route('/api/system-status')
 def api_system_status():
@@ -530,39 +807,11 @@ def api_list_customers():
         if not get_db().check_connection() or not get_db().table_exists("customers"):
             return jsonify([])
             
-        query = "SELECT customer_id, age, gender, location FROM customers"
-        # Use the same approach as in list_customers to avoid encoding issues
-        db = get_db()
-        db.connect()
-        customers = []
-        
-        result = db.fetch_all(query)
-        if result:
-            columns = ["customer_id", "age", "gender", "location"]
-            for row in result:
-                customer_dict = {}
-                for i, col in enumerate(columns):
-                    # Safely handle potentially binary data
-                    if isinstance(row[i], bytes):
-                        try:
-                            # First try UTF-8
-                            customer_dict[col] = row[i].decode('utf-8')
-                        except UnicodeDecodeError:
-                            try:
-                                # Try with 'latin-1' which can decode any byte value
-                                customer_dict[col] = row[i].decode('latin-1')
-                            except Exception:
-                                try:
-                                    # Try with 'ascii' and ignore errors
-                                    customer_dict[col] = row[i].decode('ascii', errors='ignore')
-                                except Exception:
-                                    # Last resort: represent as hex
-                                    customer_dict[col] = f"[Binary: {row[i].hex()[:10]}...]"
-                    else:
-                        customer_dict[col] = row[i]
-                customers.append(customer_dict)
-        
-        return jsonify(customers)
+        query = SQL_API_CUSTOMERS
+        columns = API_CUSTOMER_COLUMNS
+        # Stream row batches straight from the cursor; text columns are decoded by the connection
+        batches = get_db().iter_batches(query)
+        return Response(stream_with_context(stream_json_array(columns, batches)), mimetype='application/json')
     except Exception as e:
         # Return empty list instead of error
         return jsonify([])
@@ -574,29 +823,11 @@ def api_list_products():
         if not get_db().check_connection() or not get_db().table_exists("products"):
             return jsonify([])
             
-        query = "SELECT product_id, category, subcategory, price FROM products"
-        # Use the same approach as in list_products to avoid encoding issues
-        db = get_db()
-        db.connect()
-        products = []
-        
-        result = db.fetch_all(query)
-        if result:
-            columns = ["product_id", "category", "subcategory", "price"]
-            for row in result:
-                product_dict = {}
-                for i, col in enumerate(columns):
-                    # Safely handle potentially binary data
-                    if isinstance(row[i], bytes):
-                        try:
-                            product_dict[col] = row[i].decode('utf-8')
-                        except UnicodeDecodeError:
-                            product_dict[col] = "[Binary data]"
-                    else:
-                        product_dict[col] = row[i]
-                products.append(product_dict)
-        
-        return jsonify(products)
+        query = SQL_API_PRODUCTS
+        columns = API_PRODUCT_COLUMNS
+        # Stream row batches straight from the cursor; text columns are decoded by the connection
+        batches = get_db().iter_batches(query)
+        return Response(stream_with_context(stream_json_array(columns, batches)), mimetype='application/json')
     except Exception as e:
         # Return empty list instead of error
         return jsonify([])
@@ -608,26 +839,7 @@ def api_list_categories():
         if not get_db().check_connection() or not get_db().table_exists("products"):
             return jsonify([])
             
-        query = "SELECT DISTINCT category FROM products ORDER BY category"
-        # Use direct database access instead of pandas
-        db = get_db()
-        db.connect()
-        categories = []
-        
-        result = db.fetch_all(query)
-        if result:
-            for row in result:
-                # Each row should have only one element (the category)
-                if isinstance(row[0], bytes):
-                    try:
-                        category = row[0].decode('utf-8')
-                        categories.append(category)
-                    except UnicodeDecodeError:
-                        categories.append("[Binary data]")
-                else:
-                    categories.append(row[0])
-        
-        return jsonify(categories)
+        return jsonify(get_categories())
     except Exception as e:
         # Return empty list instead of error
         return jsonify([])
@@ -637,222 +849,244 @@ def export_customers():
     """Export customers data in the specified format."""
     format_type = request.args.get('format', 'csv')
     try:
-        query = """
-        SELECT customer_id, age, gender, location, customer_segment, avg_order_value
-        FROM customers
-        ORDER BY customer_id
-        """
-        # Use the same approach as in list_customers to avoid encoding issues
-        db = get_db()
-        db.connect()
-        customers = []
-        
-        result = db.fetch_all(query)
-        if result:
-            columns = ["customer_id", "age", "gender", "location", "customer_segment", "avg_order_value"]
-            for row in result:
-                customer_dict = {}
-                for i, col in enumerate(columns):
-                    # Safely handle potentially binary data
-                    if isinstance(row[i], bytes):
-                        try:
-                            # First try UTF-8
-                            customer_dict[col] = row[i].decode('utf-8')
-                        except UnicodeDecodeError:
-                            try:
-                                # Try with 'latin-1' which can decode any byte value
-                                customer_dict[col] = row[i].decode('latin-1')
-                            except Exception:
-                                try:
-                                    # Try with 'ascii' and ignore errors
-                                    customer_dict[col] = row[i].decode('ascii', errors='ignore')
-                                except Exception:
-                                    # Last resort: represent as hex
-                                    customer_dict[col] = f"[Binary: {row[i].hex()[:10]}...]"
-                    else:
-                        customer_dict[col] = row[i]
-                customers.append(customer_dict)
+        query = SQL_LIST_CUSTOMERS
+        columns = CUSTOMER_LIST_COLUMNS
+        # Stream row batches straight from the cursor; text columns are decoded by the connection
+        batches = get_db().iter_batches(query)
         
         if format_type == 'json':
-            response = jsonify(customers)
-            response.headers["Content-Disposition"] = "attachment; filename=customers.json"
-            return response
+            return Response(
+                stream_with_context(stream_json_array(columns, batches)),
+                mimetype='application/json',
+                headers={"Content-Disposition": "attachment; filename=customers.json"}
+            )
         else:  # default to CSV
-            # Convert to DataFrame for CSV export
-            customers_df = pd.DataFrame(customers)
-            csv_data = customers_df.to_csv(index=False)
-            response = app.response_class(
-                csv_data,
+            return Response(
+                stream_with_context(stream_csv(columns, batches)),
                 mimetype='text/csv',
                 headers={"Content-Disposition": "attachment; filename=customers.csv"}
             )
-            return response
     except Exception as e:
         flash(f'Error exporting customers: {e}', 'error')
         return redirect(url_for('list_customers'))
 
+@lru_cache(maxsize=None)
+def _export_products_query(filter_columns):
+    """Build the export query for a combination of filter columns.
+    
+    Each combination always yields the same SQL text, so pooled connections
+    reuse the compiled statement from their statement cache.
+    """
+    where = "WHERE " + " AND ".join(f"{column} = ?" for column in filter_columns) if filter_columns else ""
+    return SQL_EXPORT_PRODUCTS.format(where=where)
+
 @app.route('/export_products')
 def export_products():
     """Export products data in the specified format."""
     format_type = request.args.get('format', 'csv')
+    # Optional ?limit=&offset= paging; a malformed value is an error rather than a full export
     try:
-        query = """
-        SELECT product_id, category, subcategory, price, brand, product_rating
-        FROM products
-        ORDER BY category, subcategory
-        """
-        # Use the same approach as in export_customers to avoid encoding issues
-        db = get_db()
-        db.connect()
-        products = []
+        limit = int(request.args.get('limit', -1))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        abort(400, description="limit and offset must be integers")
+    
+    try:
+        # Whitelisted equality filters, applied in SQL along with the paging
+        filters = [(column, request.args[arg]) for arg, column in EXPORT_PRODUCT_FILTERS.items() if request.args.get(arg)]
+        query = _export_products_query(tuple(column for column, _ in filters))
+        params = [value for _, value in filters] + [limit, offset]
         
-        result = db.fetch_all(query)
-        if result:
-            columns = ["product_id", "category", "subcategory", "price", "brand", "product_rating"]
-            for row in result:
-                product_dict = {}
-                for i, col in enumerate(columns):
-                    # Safely handle potentially binary data
-                    if isinstance(row[i], bytes):
-                        try:
-                            # First try UTF-8
-                            product_dict[col] = row[i].decode('utf-8')
-                        except UnicodeDecodeError:
-                            try:
-                                # Try with 'latin-1' which can decode any byte value
-                                product_dict[col] = row[i].decode('latin-1')
-                            except Exception:
-                                try:
-                                    # Try with 'ascii' and ignore errors
-                                    product_dict[col] = row[i].decode('ascii', errors='ignore')
-                                except Exception:
-                                    # Last resort: represent as hex
-                                    product_dict[col] = f"[Binary: {row[i].hex()[:10]}...]"
-                    else:
-                        product_dict[col] = row[i]
-                products.append(product_dict)
+        db = get_db()
+        columns = PRODUCT_LIST_COLUMNS
         
         if format_type == 'json':
-            response = jsonify(products)
-            response.headers["Content-Disposition"] = "attachment; filename=products.json"
-            return response
+            # Encode rows as they come off the cursor with the app's JSON provider (orjson when installed)
+            return Response(
+                stream_with_context(stream_json_array(columns, db.iter_batches(query, params))),
+                mimetype='application/json',
+                headers={"Content-Disposition": "attachment; filename=products.json"}
+            )
         else:  # default to CSV
-            # Convert to DataFrame for CSV export
-            products_df = pd.DataFrame(products)
-            csv_data = products_df.to_csv(index=False)
-            response = app.response_class(
-                csv_data,
+            # Write rows to the response as they come off the cursor
+            return Response(
+                stream_with_context(stream_csv(columns, db.iter_batches(query, params))),
                 mimetype='text/csv',
                 headers={"Content-Disposition": "attachment; filename=products.csv"}
             )
-            return response
     except Exception as e:
         flash(f'Error exporting products: {e}', 'error')
         return redirect(url_for('list_products'))
 
+ENCODING_ROW_HTML = "<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>"
+ENCODING_FIX_FORM_HTML = (
+    "<h2>Fix Options</h2>"
+    "<form method='post' action='/debug/run-fix-encoding'>"
+    "<input type='submit' value='Run Database Fix'>"
+    "</form>"
+)
+
+def _decode_sample_bytes(value):
+    """Decode a binary value for display, returning the text and the encoding that worked."""
+    # ASCII is valid UTF-8, so the common case needs no failed decode attempt
+    if value.isascii():
+        return value.decode('ascii'), 'utf-8'
+    try:
+        return value.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        # latin-1 maps every byte, so this always succeeds
+        return value.decode('latin-1'), 'latin-1'
+
+@lru_cache(maxsize=32)
+def _render_encoding_sample(rows):
+    """Render the sample customer rows of the encoding debug page, decoding any binary values."""
+    if not rows:
+        return "<p>No customer records found.</p>"
+    
+    parts = [
+        f"<p>Found {len(rows)} customer records.</p>",
+        "<h2>Sample Customer Data</h2>",
+        "<table border='1'><tr><th>Column</th><th>Data Type</th><th>Value</th><th>Hex (if binary)</th></tr>"
+    ]
+    
+    for row in rows[:5]:  # Show first 5 rows
+        for col, value in zip(DEBUG_CUSTOMER_COLUMNS, row):
+            value_type = type(value).__name__
+            
+            if isinstance(value, bytes):
+                decoded, encoding = _decode_sample_bytes(value)
+                parts.append(ENCODING_ROW_HTML.format(col, value_type, f"{decoded} (decoded with {encoding})", value.hex()[:20]))
+            else:
+                parts.append(ENCODING_ROW_HTML.format(col, value_type, value, "N/A"))
+    
+    parts.append("</table>")
+    
+    # Add option to fix the database
+    parts.append(ENCODING_FIX_FORM_HTML)
+    return ''.join(parts)
+
 @app.route('/debug/fix-encoding')
 def debug_fix_encoding():
     """Debug endpoint to analyze and fix database encoding issues."""
-    output = "<h1>Database Encoding Debug</h1>"
+    parts = ["<h1>Database Encoding Debug</h1>"]
     
     try:
         # Connect to database
         db = get_db()
-        db.connect()
         
         # Check if database exists
         if not os.path.exists(db.db_path):
-            output += f"<p style='color:red'>Database file does not exist at {db.db_path}</p>"
-            return output
+            parts.append(f"<p style='color:red'>Database file does not exist at {db.db_path}</p>")
+            return ''.join(parts)
         
-        output += f"<p>Database file exists at {db.db_path}</p>"
+        parts.append(f"<p>Database file exists at {db.db_path}</p>")
         
         # Check encoding pragma
         encoding_result = db.fetch_one("PRAGMA encoding")
-        output += f"<p>Database encoding: {encoding_result[0] if encoding_result else 'Unknown'}</p>"
+        parts.append(f"<p>Database encoding: {encoding_result[0] if encoding_result else 'Unknown'}</p>")
         
         # Check for binary data in customers table
         try:
-            query = "SELECT customer_id, age, gender, location FROM customers LIMIT 20"
-            result = db.fetch_all(query)
-            
-            if not result:
-                output += "<p>No customer records found.</p>"
-            else:
-                output += f"<p>Found {len(result)} customer records.</p>"
-                output += "<h2>Sample Customer Data</h2>"
-                output += "<table border='1'><tr><th>Column</th><th>Data Type</th><th>Value</th><th>Hex (if binary)</th></tr>"
-                
-                for row in result[:5]:  # Show first 5 rows
-                    for i, col in enumerate(['customer_id', 'age', 'gender', 'location']):
-                        value = row[i]
-                        value_type = type(value).__name__
-                        
-                        if isinstance(value, bytes):
-                            # Try to decode with different encodings
-                            decoded = None
-                            for encoding in ['utf-8', 'latin-1', 'ascii']:
-                                try:
-                                    decoded = value.decode(encoding)
-                                    output += f"<tr><td>{col}</td><td>{value_type}</td><td>{decoded} (decoded with {encoding})</td><td>{value.hex()[:20]}</td></tr>"
-                                    break
-                                except UnicodeDecodeError:
-                                    continue
-                            
-                            if decoded is None:
-                                output += f"<tr><td>{col}</td><td>{value_type}</td><td>Cannot decode</td><td>{value.hex()[:20]}</td></tr>"
-                        else:
-                            output += f"<tr><td>{col}</td><td>{value_type}</td><td>{value}</td><td>N/A</td></tr>"
-                
-                output += "</table>"
-                
-                # Add option to fix the database
-                output += "<h2>Fix Options</h2>"
-                output += "<form method='post' action='/debug/run-fix-encoding'>"
-                output += "<input type='submit' value='Run Database Fix'>"
-                output += "</form>"
+            result = db.fetch_all(SQL_DEBUG_CUSTOMERS)
+            # The table HTML only depends on the sampled rows, so identical samples reuse it
+            parts.append(_render_encoding_sample(tuple(result or ())))
         except Exception as e:
-            output += f"<p style='color:red'>Error accessing customers table: {str(e)}</p>"
-        
-        # Close connection
-        db.close()
+            parts.append(f"<p style='color:red'>Error accessing customers table: {str(e)}</p>")
         
     except Exception as e:
-        output += f"<p style='color:red'>Error: {str(e)}</p>"
+        parts.append(f"<p style='color:red'>Error: {str(e)}</p>")
     
-    return output
+    return ''.join(parts)
 
 @app.route('/debug/run-fix-encoding', methods=['POST'])
 def debug_run_fix_encoding():
     """Run the database fix process."""
     try:
-        # Import fix_database function from the script
-        sys.path.append(str(Path(__file__).parent.parent))
-        from fix_database import fix_database
-        
-        # Run the fix
-        success = fix_database()
-        
-        if success:
-            flash("Database encoding fix completed successfully. Please restart the application.", "success")
-        else:
-            flash("Database encoding fix failed. Check the server logs for details.", "error")
+        # Convert binary text values in place with bulk UPDATEs
+        fixed = get_db().fix_text_encoding()
+        _render_encoding_sample.cache_clear()
+        flash(f"Database encoding fix completed successfully ({fixed} values converted).", "success")
     except Exception as e:
         flash(f"Error running database fix: {str(e)}", "error")
     
     return redirect(url_for('debug_fix_encoding'))
 
+# Response compression for text-heavy pages, API lists and exports
+app.config.setdefault('COMPRESS_MIMETYPES', ['text/html', 'text/csv', 'application/json'])
+app.config.setdefault('COMPRESS_LEVEL', 6)
+app.config.setdefault('COMPRESS_MIN_SIZE', 2048)
+
+def _gzip_stream(chunks, level):
+    """Gzip a streamed body, flushing after each chunk so the client keeps receiving data."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+@app.after_request
+def compress_response(response):
+    """Gzip the response when the client accepts it and the content is worth compressing."""
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in app.config['COMPRESS_MIMETYPES']):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    if 'gzip' not in request.accept_encodings:
+        return response
+    
+    level = app.config['COMPRESS_LEVEL']
+    if response.is_streamed:
+        # Streamed exports have no known size, so they are always compressed
+        response.response = _gzip_stream(response.response, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(zlib.compress(data, level, wbits=31))
+    
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
 @app.teardown_appcontext
 def close_resources(e=None):
     """Close resources at the end of the request."""
-    # Close database
+    # Return the request's database connection to the pool
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        db.release()
+
+# Worker threads of the production WSGI server
+SERVER_THREADS = int(os.environ.get('SMARTSHOP_SERVER_THREADS', 8))
+
+def debug_enabled():
+    """Check whether the Flask debug server was requested via FLASK_DEBUG or FLASK_ENV."""
+    return (os.environ.get('FLASK_DEBUG', '').lower() in ('1', 'true', 'yes')
+            or os.environ.get('FLASK_ENV') == 'development')
+
+def serve(host='0.0.0.0', port=5000):
+    """Serve the web app with waitress, or with the Flask debug server when debugging is enabled.
+    
+    Args:
+        host: Interface to listen on
+        port: Port to listen on
+    """
+    if debug_enabled():
+        app.run(host=host, port=port, debug=True)
+        return
+    
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        app.logger.warning("waitress is not installed; falling back to Flask's threaded server.")
+        app.run(host=host, port=port, debug=False, threaded=True)
+        return
     
-    # Close any agent resources if needed
-    agent = g.pop('agent', None)
-    # If the agent has a close method, you could call it here
+    waitress_serve(app, host=host, port=port, threads=SERVER_THREADS)
 
 if __name__ == '__main__':
     # Create template and static directories if they don't exist
@@ -862,4 +1096,4 @@ if __name__ == '__main__':
     static_dir.mkdir(exist_ok=True)
     
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=True) 
\ No newline at end of file
+    serve(port=port) 
\ No newline at end of file
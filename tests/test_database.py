@@ -0,0 +1,161 @@
+"""
+Tests for the SQLite database layer and the CSV data loader
+"""
+
+import sys
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+# Add the parent directory to the system path
+sys.path.append(str(Path(__file__).parent.parent))
+from smartshop.utils.database import Database
+from smartshop.data_loader import load_customer_data, load_product_data
+
+def _customer_rows(count):
+    """Build customer CSV rows in the dataset's column layout."""
+    return [{
+        'Customer_ID': f'C{i}',
+        'Age': 30 + i,
+        'Gender': 'Female',
+        'Location': 'Chennai',
+        'Browsing_History': "['Books', 'Electronics']",
+        'Purchase_History': "['Books']",
+        'Customer_Segment': 'New Visitor',
+        'Avg_Order_Value': 100.0 + i
+    } for i in range(count)]
+
+def _product_rows(count):
+    """Build product CSV rows in the dataset's column layout."""
+    return [{
+        'Product_ID': f'P{i}',
+        'Category': 'Books',
+        'Subcategory': 'Fiction',
+        'Price': 10.0 + i,
+        'Brand': 'Brand A',
+        'Average_Rating_of_Similar_Products': 4.0,
+        'Product_Rating': 4.5,
+        'Customer_Review_Sentiment_Score': 0.8
+    } for i in range(count)]
+
+class DatabaseTestCase(unittest.TestCase):
+    """Base test case with a fresh database in a temporary directory."""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp.name)
+        self.db = Database(db_path=str(self.tmp_path / 'smartshop.db'))
+        self.db.create_tables()
+    
+    def tearDown(self):
+        self.db.close_all()
+        self.tmp.cleanup()
+    
+    def write_csv(self, name, rows):
+        """Write rows to a CSV file in the temporary directory and return its path."""
+        path = self.tmp_path / name
+        pd.DataFrame(rows).to_csv(path, index=False)
+        return path
+    
+    def count(self, table):
+        """Count a table's rows directly, bypassing the counters table."""
+        return self.db.fetch_one(f"SELECT COUNT(*) FROM {table}")[0]
+
+class TestRowCounters(DatabaseTestCase):
+    """The counters table must match the real row counts after loads and reloads."""
+    
+    def test_counters_after_load_and_reload(self):
+        customers = self.write_csv('customers.csv', _customer_rows(5))
+        products = self.write_csv('products.csv', _product_rows(7))
+        
+        for _ in range(2):
+            load_customer_data(self.db, customers)
+            load_product_data(self.db, products)
+            self.db.connect()
+            self.assertEqual(self.db.get_row_counts(), {'customers': 5, 'products': 7})
+        
+        self.assertEqual(self.count('customers'), 5)
+        self.assertEqual(self.count('products'), 7)
+    
+    def test_counters_follow_deletes(self):
+        self.db.insert_products_bulk(
+            [{'product_id': f'P{i}', 'category': 'Books'} for i in range(3)]
+        )
+        self.db.execute("DELETE FROM products WHERE product_id = ?", ('P0',), commit=True)
+        
+        self.assertEqual(self.db.get_row_counts()['products'], 2)
+        self.assertEqual(self.count('products'), 2)
+    
+    def test_refresh_counters(self):
+        self.db.insert_products_bulk([{'product_id': 'P1'}])
+        self.db.execute("UPDATE counters SET n = 99 WHERE table_name = 'products'", commit=True)
+        
+        self.db.refresh_counters()
+        
+        self.assertEqual(self.db.get_row_counts()['products'], 1)
+
+class TestTransaction(DatabaseTestCase):
+    """transaction() defers commits to the outermost block and rolls back on errors."""
+    
+    INSERT = "INSERT INTO products (product_id) VALUES (?)"
+    
+    def test_nested_commit_is_deferred(self):
+        with self.db.transaction():
+            with self.db.transaction():
+                self.db.execute(self.INSERT, ('P1',), commit=True)
+            # The inner block's commit waits for the outer block
+            self.assertTrue(self.db.conn.in_transaction)
+        
+        self.assertFalse(self.db.conn.in_transaction)
+        self.assertEqual(self.count('products'), 1)
+    
+    def test_error_rolls_back_outer_block(self):
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction():
+                self.db.execute(self.INSERT, ('P1',), commit=True)
+                with self.db.transaction():
+                    self.db.execute(self.INSERT, ('P2',), commit=True)
+                    raise RuntimeError("boom")
+        
+        self.assertEqual(self.count('products'), 0)
+        self.assertFalse(self.db._in_transaction())
+    
+    def test_failed_bulk_insert_leaves_nothing_pending(self):
+        params = [('P1',), ('P2',), ('P1',)]
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.db.executemany_chunked(self.INSERT, params, chunk_size=1)
+        
+        self.assertFalse(self.db.conn.in_transaction)
+        self.assertEqual(self.count('products'), 0)
+        
+        # A retry after the failure does not see rows from the failed batch
+        self.db.executemany_chunked(self.INSERT, params[:2])
+        self.assertEqual(self.count('products'), 2)
+
+class TestLoadCsv(DatabaseTestCase):
+    """The CSV loader skips bad rows and copes with encodings past the sniffed sample."""
+    
+    def test_latin1_bytes_after_sample(self):
+        rows = _product_rows(3000)
+        path = self.write_csv('products.csv', rows)
+        # Put a latin-1 byte well past the sampled prefix
+        raw = path.read_bytes().replace(b'P2999,Books', b'P2999,Caf\xe9')
+        path.write_bytes(raw)
+        
+        # Small chunks so some rows are read before the bad byte and some after the fallback
+        with mock.patch('smartshop.data_loader.CSV_CHUNK_SIZE', 1000):
+            load_product_data(self.db, path)
+        
+        self.db.connect()
+        self.assertEqual(self.count('products'), 3000)
+        self.assertEqual(self.db.get_row_counts()['products'], 3000)
+        self.assertEqual(
+            self.db.fetch_one("SELECT category FROM products WHERE product_id = 'P2999'")[0], 'Café'
+        )
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+"""
+Tests for the Flask web application's exports, compression and background jobs
+"""
+
+import sys
+import csv
+import gzip
+import io
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+# Add the parent directory to the system path
+sys.path.append(str(Path(__file__).parent.parent))
+from smartshop import web_app
+from smartshop.utils.database import Database
+
+PRODUCTS = [
+    {'product_id': f'P{i:03d}', 'category': category, 'subcategory': 'All', 'price': float(i),
+     'brand': 'Brand A' if i % 2 else 'Brand B', 'product_rating': 4.0}
+    for i, category in enumerate(['Books'] * 30 + ['Beauty'] * 20)
+]
+
+class WebAppTestCase(unittest.TestCase):
+    """Base test case serving the app from a fresh database in a temporary directory."""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = Database(db_path=str(Path(self.tmp.name) / 'smartshop.db'))
+        self.db.create_tables()
+        self.db.insert_products_bulk(PRODUCTS)
+        
+        # Point the request pool at the temporary database
+        self.original_db_path = web_app.DB_POOL.db_path
+        web_app.DB_POOL.close_all()
+        web_app.DB_POOL.db_path = self.db.db_path
+        
+        web_app.app.config['TESTING'] = True
+        self.client = web_app.app.test_client()
+    
+    def tearDown(self):
+        web_app.DB_POOL.close_all()
+        web_app.DB_POOL.db_path = self.original_db_path
+        self.db.close_all()
+        self.tmp.cleanup()
+    
+    def export_csv(self, query=''):
+        """Fetch /export_products as CSV and return the parsed data rows."""
+        response = self.client.get('/export_products' + query)
+        self.assertEqual(response.status_code, 200)
+        return list(csv.reader(io.StringIO(response.get_data(as_text=True))))[1:]
+
+class TestExportProducts(WebAppTestCase):
+    """Export paging and filters are validated and applied in SQL."""
+    
+    def test_malformed_paging_is_rejected(self):
+        for query in ('?limit=abc', '?offset=x', '?limit=10&offset=1.5'):
+            with self.subTest(query=query):
+                response = self.client.get('/export_products' + query)
+                self.assertEqual(response.status_code, 400)
+    
+    def test_pages_cover_every_row_once(self):
+        pages = [self.export_csv(f'?limit=15&offset={offset}') for offset in range(0, 60, 15)]
+        
+        self.assertEqual([len(page) for page in pages], [15, 15, 15, 5])
+        ids = [row[0] for page in pages for row in page]
+        self.assertEqual(sorted(ids), sorted(p['product_id'] for p in PRODUCTS))
+        self.assertEqual(ids, [row[0] for row in self.export_csv()])
+    
+    def test_filters(self):
+        rows = self.export_csv('?category=Beauty&brand=Brand+A')
+        
+        self.assertEqual(len(rows), 10)
+        self.assertTrue(all(row[1] == 'Beauty' and row[4] == 'Brand A' for row in rows))
+        # Unknown parameters are not treated as filters
+        self.assertEqual(len(self.export_csv('?price=1')), len(PRODUCTS))
+    
+    def test_json_export(self):
+        response = self.client.get('/export_products?format=json&category=Books&limit=3')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/json')
+        products = response.get_json()
+        self.assertEqual([p['product_id'] for p in products], ['P000', 'P001', 'P002'])
+
+class TestCompression(WebAppTestCase):
+    """Streamed responses are gzipped only for clients that accept it."""
+    
+    def test_streamed_export_is_gzipped(self):
+        plain = self.client.get('/export_products').get_data()
+        response = self.client.get('/export_products', headers={'Accept-Encoding': 'gzip'})
+        
+        self.assertEqual(response.headers.get('Content-Encoding'), 'gzip')
+        self.assertIn('Accept-Encoding', response.headers.get('Vary', ''))
+        self.assertNotIn('Content-Length', response.headers)
+        self.assertEqual(gzip.decompress(response.get_data()), plain)
+    
+    def test_identity_without_accept_encoding(self):
+        response = self.client.get('/export_products')
+        
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertTrue(response.get_data(as_text=True).startswith('product_id,'))
+
+class TestJobs(WebAppTestCase):
+    """A background job moves from a progress page to its finished result."""
+    
+    def wait_for(self, job_id, state):
+        """Poll the job API until the job reaches the given state."""
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            job = self.client.get(f'/api/job/{job_id}').get_json()
+            if job['state'] == state:
+                return job
+            time.sleep(0.05)
+        self.fail(f"Job {job_id} did not reach state {state}")
+    
+    def test_job_lifecycle(self):
+        release = threading.Event()
+        
+        def analysis():
+            release.wait(5)
+            return {'answer': 42}
+        
+        job_id = web_app.submit_job('product_analysis', analysis)
+        
+        response = self.client.get(f'/jobs/{job_id}')
+        self.assertEqual(response.status_code, 200)
+        page = response.get_data(as_text=True)
+        self.assertIn('http-equiv="refresh"', page)
+        self.assertIn('This page refreshes automatically', page)
+        
+        release.set()
+        job = self.wait_for(job_id, 'finished')
+        self.assertEqual(job['kind'], 'product_analysis')
+        self.assertEqual(job['result'], {'answer': 42})
+    
+    def test_failed_job_redirects_to_form(self):
+        def analysis():
+            raise RuntimeError("model unavailable")
+        
+        job_id = web_app.submit_job('product_analysis', analysis)
+        job = self.wait_for(job_id, 'failed')
+        self.assertEqual(job['error'], 'model unavailable')
+        
+        response = self.client.get(f'/jobs/{job_id}')
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.headers['Location'].endswith('/product-analysis'))
+    
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get('/api/job/missing').status_code, 404)
+        self.assertEqual(self.client.get('/jobs/missing').status_code, 302)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,28 +1,67 @@
 import os
+import codecs
 import pandas as pd
 import glob
+from pathlib import Path
+
+# chardet is optional; without it, samples are checked for UTF-8 and otherwise read as latin1
+try:
+    import chardet
+except ImportError:
+    chardet = None
+
+# pandas hands parsing to pyarrow's multi-threaded CSV reader when it is installed
+try:
+    from pyarrow import ArrowInvalid
+    CSV_ENGINE = 'pyarrow'
+    # pyarrow reports undecodable bytes as ArrowInvalid rather than UnicodeDecodeError
+    DECODE_ERRORS = (UnicodeDecodeError, ArrowInvalid)
+except ImportError:
+    CSV_ENGINE = 'c'
+    DECODE_ERRORS = (UnicodeDecodeError,)
+
+# Number of bytes read from the start of a file to detect its encoding
+ENCODING_SAMPLE_SIZE = 65536
 
 def list_files(directory):
-    """List all files in the given directory and subdirectories."""
-    all_files = []
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            all_files.append(os.path.join(root, file))
-    return all_files
+    """Yield the paths of all files in the given directory and subdirectories."""
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                yield from list_files(entry.path)
+            elif entry.is_file():
+                yield entry.path
+
+def detect_encoding(file_path, sample_size=ENCODING_SAMPLE_SIZE):
+    """Guess the encoding of a file from a sample of its first bytes."""
+    with open(file_path, 'rb') as f:
+        raw = f.read(sample_size)
+    
+    if raw.isascii():
+        return 'utf-8'
+    if chardet is not None:
+        return chardet.detect(raw)['encoding'] or 'utf-8'
+    try:
+        # Incremental decoding tolerates a multi-byte character cut off at the end of the sample
+        codecs.getincrementaldecoder('utf-8')().decode(raw, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin1'
 
 def view_csv(file_path, num_rows=5):
     """View the first few rows of a CSV file."""
     try:
-        # Try different encodings
-        for encoding in ['utf-8', 'latin1', 'cp1252']:
-            try:
-                df = pd.read_csv(file_path, encoding=encoding)
-                break
-            except UnicodeDecodeError:
-                continue
-            except Exception as e:
-                print(f"Error reading {file_path} with encoding {encoding}: {e}")
-                return None
+        # Detect the encoding up front so the file is parsed once
+        encoding = detect_encoding(file_path)
+        try:
+            df = pd.read_csv(file_path, encoding=encoding, engine=CSV_ENGINE)
+        except DECODE_ERRORS:
+            # Only the sample was checked; latin1 maps every byte, so this always decodes
+            encoding = 'latin1'
+            df = pd.read_csv(file_path, encoding=encoding, engine=CSV_ENGINE)
+        except Exception as e:
+            print(f"Error reading {file_path} with encoding {encoding}: {e}")
+            return None
         
         print(f"\n{'='*80}")
         print(f"File: {file_path}")
@@ -43,10 +82,8 @@ def view_csv(file_path, num_rows=5):
 if __name__ == "__main__":
     dataset_dir = "Dataset"
     
-    print("Listing all files in Dataset directory:")
-    files = list_files(dataset_dir)
-    
-    csv_files = [f for f in files if f.endswith('.csv')]
+    print("Listing CSV files in Dataset directory:")
+    csv_files = sorted(Path(dataset_dir).rglob('*.csv'))
     print(f"Found {len(csv_files)} CSV files:")
     for file in csv_files:
         print(f"- {file}")